@@ -1,7 +1,29 @@
-from .ibgoogleanalytics import GoogleAnalytics
-from .searchconsole import IbSearchConsole
-from .redash import Redash
-from .ibmapper import IbMapper
-from .gsheets import GSheets
-from .slack.slack import Slack
-from .ibgoogleads import GoogleAds
+from typing import TYPE_CHECKING
+
+from ._lazy import lazy_attributes
+
+# Each wrapper drags in its own heavy dependencies (geopandas, folium, gspread,
+# googleads, googleapiclient, ...), so they are only imported on first access.
+# See PEP 562 for how module-level `__getattr__` works.
+_lazy_attributes = {
+    'GoogleAnalytics': '.ibgoogleanalytics',
+    'IbSearchConsole': '.searchconsole',
+    'Redash': '.redash',
+    'IbMapper': '.ibmapper',
+    'GSheets': '.gsheets',
+    'Slack': '.slack.slack',
+    'GoogleAds': '.ibgoogleads',
+}
+
+__all__ = list(_lazy_attributes)
+
+if TYPE_CHECKING:
+    from .ibgoogleanalytics import GoogleAnalytics
+    from .searchconsole import IbSearchConsole
+    from .redash import Redash
+    from .ibmapper import IbMapper
+    from .gsheets import GSheets
+    from .slack.slack import Slack
+    from .ibgoogleads import GoogleAds
+
+__getattr__, __dir__ = lazy_attributes(globals(), _lazy_attributes)
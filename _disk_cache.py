@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Callable, Optional
+
+
+class DiskCache:
+    """
+    The storage shared by the on-disk caches of the wrappers, e.g. `RedashCache`.
+
+    Every entry is a data file named after its key in `directory`, next to an optional JSON file of
+    metadata. Entries are written atomically, and when the data files grow over `max_bytes`, the
+    least recently used entries are evicted. Subclasses decide what is stored, how keys are built
+    and when an entry is still valid, and count every lookup as a hit or a miss.
+    """
+    data_suffix = '.parquet'
+    # None when the metadata is stored in the data file itself.
+    meta_suffix: Optional[str] = '.json'
+
+    def __init__(self, directory: str, max_bytes: int = 2**30) -> None:
+        """
+        Input:
+            - directory: where to store the entries. Created if it does not exist.
+            - max_bytes: the maximum total size of the data files.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def _hash(value) -> str:
+        "Returns a key for any JSON-serializable `value`. Equal values give the same key regardless of dict order."
+        normalized = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+    def evict(self) -> int:
+        "Removes the least recently used entries until the cache fits in `max_bytes`. Returns the number removed."
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                if name.endswith(self.data_suffix):
+                    stat = os.stat(os.path.join(self.directory, name))
+                    entries.append((stat.st_mtime, stat.st_size, name[:-len(self.data_suffix)]))
+
+            total_bytes = sum(size for _, size, _ in entries)
+            removed = 0
+            for _, size, key in sorted(entries):
+                if total_bytes <= self.max_bytes:
+                    break
+                self._remove(key)
+                total_bytes -= size
+                removed += 1
+        return removed
+
+    def clear(self) -> None:
+        "Removes every entry and resets the counters."
+        suffixes = tuple(suffix for suffix in (self.data_suffix, self.meta_suffix) if suffix)
+        for name in os.listdir(self.directory):
+            if name.endswith(suffixes):
+                os.remove(os.path.join(self.directory, name))
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        "Returns hit/miss counters and the current size of the cache."
+        sizes = [os.path.getsize(os.path.join(self.directory, name))
+                 for name in os.listdir(self.directory) if name.endswith(self.data_suffix)]
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(sizes),
+            'bytes': sum(sizes),
+        }
+
+    def _paths(self, key: str):
+        "Returns the paths of the data file and of the metadata file, or None, of `key`."
+        base = os.path.join(self.directory, key)
+        return base + self.data_suffix, (base + self.meta_suffix if self.meta_suffix else None)
+
+    @staticmethod
+    def _load_json(path: str) -> Optional[dict]:
+        "Returns the JSON object in `path`, or None if it is missing or unreadable."
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write(self, key: str, write_data: Callable[[str], None], meta: Optional[dict] = None) -> None:
+        """
+        Stores an entry under `key`, then evicts entries over `max_bytes`. `write_data` is called with the
+        path to write the data file to. Errors it raises are raised after cleaning up.
+        """
+        data_path, meta_path = self._paths(key)
+
+        # Write to temporary files first so that readers never see a partial entry.
+        suffix = f'.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            write_data(data_path + suffix)
+        except Exception:
+            if os.path.exists(data_path + suffix):
+                os.remove(data_path + suffix)
+            raise
+        if meta_path is not None:
+            with open(meta_path + suffix, 'w') as f:
+                json.dump(meta, f)
+        os.replace(data_path + suffix, data_path)
+        if meta_path is not None:
+            os.replace(meta_path + suffix, meta_path)
+
+        self.evict()
+
+    def _touch(self, key: str) -> None:
+        "Marks `key` as recently used, so that eviction keeps it longer."
+        try:
+            os.utime(self._paths(key)[0])
+        except FileNotFoundError:
+            pass
+
+    def _remove(self, key: str) -> None:
+        for path in self._paths(key):
+            if path is None:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
@@ -0,0 +1,30 @@
+import importlib
+
+
+def lazy_attributes(module_globals: dict, attributes: dict):
+    """
+    Returns the module-level `__getattr__` and `__dir__` that import each of `attributes` the first time it is accessed.
+    See PEP 562 for how they work.
+    Input:
+        - module_globals: `globals()` of the package `__init__`.
+        - attributes: the module to import each attribute from, relative to the package, e.g. {'Redash': '.redash'}.
+    Usage:
+        __getattr__, __dir__ = lazy_attributes(globals(), {'Redash': '.redash'})
+    """
+    package = module_globals['__name__']
+
+    def __getattr__(name: str):
+        if name not in attributes:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+
+        module = importlib.import_module(attributes[name], package)
+        value = getattr(module, name)
+
+        # Cache on the module so that `__getattr__` is not called again for `name`.
+        module_globals[name] = value
+        return value
+
+    def __dir__():
+        return sorted(set(module_globals) | set(module_globals.get('__all__', [])) | set(attributes))
+
+    return __getattr__, __dir__
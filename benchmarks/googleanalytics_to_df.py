@@ -0,0 +1,97 @@
+"""
+Compares GoogleAnalytics.to_df against the previous DataFrame-of-dicts implementation.
+
+Usage:
+    python benchmarks/googleanalytics_to_df.py [--rows 100000]
+
+The report is synthetic, so no credentials are needed.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'ibgoogleanalytics'))
+sys.path.insert(0, REPO_ROOT)  # for the modules shared by the wrappers, e.g. _disk_cache
+from src.googleanalytics import GoogleAnalytics  # noqa: E402
+
+DIMENSIONS = ['ga:date', 'ga:pagePath']
+METRICS = [('ga:sessions', 'INTEGER'), ('ga:pageviews', 'INTEGER'), ('ga:bounceRate', 'PERCENT')]
+
+
+def legacy_to_df(report, report_request):
+    "The implementation of `to_df` before the columnar conversion."
+    dimensions = report['columnHeader']['dimensions']
+    columns = [header['name'] for header in report['columnHeader']['metricHeader']['metricHeaderEntries']]
+    df = pd.DataFrame(report['data']['rows'])
+
+    keys = np.array(df['dimensions'].tolist())
+    for ix, dim in enumerate(dimensions):
+        df[dim] = keys[:, ix]
+    df.drop('dimensions', axis=1, inplace=True)
+
+    df['metrics'] = df.metrics.apply(lambda x: x[0]['values'])
+    values = np.array(df['metrics'].tolist())
+    for ix, col in enumerate(columns):
+        df[col] = values[:, ix].astype(float)
+    df.drop('metrics', axis=1, inplace=True)
+
+    date_ranges = report_request['dateRanges'][0]
+    df['startDate'] = date_ranges['startDate']
+    df['endDate'] = date_ranges['endDate']
+    df.sort_values(dimensions[0], inplace=True)
+    return df
+
+
+def make_report(n_rows):
+    rng = np.random.default_rng(0)
+    days = rng.integers(1, 29, n_rows)
+    pages = rng.integers(0, n_rows // 5, n_rows)
+    sessions = rng.integers(1, 1000, n_rows)
+    rows = [{'dimensions': [f'202003{d:02d}', f'/tokyo-rentalspace/{p}'],
+             'metrics': [{'values': [str(s), str(s * 3), f'{s % 100 + 0.5}']}]}
+            for d, p, s in zip(days, pages, sessions)]
+    return {
+        'columnHeader': {
+            'dimensions': DIMENSIONS,
+            'metricHeader': {'metricHeaderEntries': [{'name': name, 'type': type} for name, type in METRICS]},
+        },
+        'data': {'rows': rows},
+    }
+
+
+def timeit(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    report = make_report(args.rows)
+    report_request = {'dateRanges': [{'startDate': '2020-03-01', 'endDate': '2020-03-28'}]}
+    ga = GoogleAnalytics.__new__(GoogleAnalytics)
+
+    legacy = timeit(lambda: legacy_to_df(report, report_request), args.repeat)
+    columnar = timeit(lambda: ga._report_to_df(report, report_request), args.repeat)
+    unsorted = timeit(lambda: ga._report_to_df(report, report_request, sort=False), args.repeat)
+
+    print(f"{args.rows} rows, dimensions={DIMENSIONS}")
+    print(f"  legacy:            {legacy:.3f} s")
+    print(f"  columnar:          {columnar:.3f} s ({legacy / columnar:.1f}x faster)")
+    print(f"  columnar, no sort: {unsorted:.3f} s ({legacy / unsorted:.1f}x faster)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Compares GSheets.iter_frames against reading a whole sheet with get_values and the previous rows_to_df.
+
+Usage:
+    python benchmarks/gsheets_read.py [--rows 200000] [--latency 0.5]
+
+The sheet is an in-memory stand-in for a gspread Worksheet, so no credentials are needed.
+Every request sleeps for a fixed latency plus a time proportional to the number of cells,
+to mimic the Sheets API.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gsheets.gsheets import GSheets  # noqa: E402
+from gspread.utils import a1_to_rowcol  # noqa: E402
+
+
+class InMemorySheet:
+    "Serves `get_values` and `row_values` from a list of rows."
+
+    def __init__(self, rows, latency, seconds_per_cell):
+        self.rows = rows
+        self.row_count = len(rows)
+        self.latency = latency
+        self.seconds_per_cell = seconds_per_cell
+
+    def _wait(self, rows):
+        time.sleep(self.latency + self.seconds_per_cell * sum(len(row) for row in rows))
+
+    def row_values(self, row, **kwargs):
+        self._wait([self.rows[row - 1]])
+        return list(self.rows[row - 1])
+
+    def get_values(self, range_name=None, **kwargs):
+        if range_name is None:
+            rows = self.rows
+        else:
+            start, end = range_name.split(':')
+            rows = self.rows[a1_to_rowcol(start)[0] - 1:a1_to_rowcol(end)[0]]
+        self._wait(rows)
+        return [list(row) for row in rows]
+
+
+def legacy_rows_to_df(rows):
+    "The implementation of `rows_to_df` before the sample-based type inference."
+    df = pd.DataFrame(rows[1:])
+    df.columns = rows[0]
+    for col in df.columns:
+        # `errors='ignore'` is no longer supported by pandas, so this is its equivalent.
+        try:
+            df[col] = pd.to_numeric(df[col])
+        except (ValueError, TypeError):
+            pass
+    return df
+
+
+def make_rows(n_rows):
+    rng = np.random.default_rng(0)
+    ids = np.arange(n_rows)
+    prices = rng.integers(1000, 50000, n_rows)
+    ratings = rng.random(n_rows) * 5
+    areas = rng.choice(['渋谷', '新宿', '池袋', '品川'], n_rows)
+    return [['id', 'price', 'rating', 'area', 'name']] + \
+        [[int(i), int(p), float(r), a, f'space {i}'] for i, p, r, a in zip(ids, prices, ratings, areas)]
+
+
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    df = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return df, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--chunk-rows', type=int, default=20_000)
+    parser.add_argument('--max-workers', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.5)
+    parser.add_argument('--seconds-per-cell', type=float, default=1e-6)
+    args = parser.parse_args()
+
+    sheet = InMemorySheet(make_rows(args.rows), args.latency, args.seconds_per_cell)
+    gs = GSheets.__new__(GSheets)
+
+    legacy, legacy_time, legacy_peak = measure(lambda: legacy_rows_to_df(sheet.get_values()))
+    _, sequential_time, sequential_peak = measure(lambda: gs.read(sheet, chunk_rows=args.chunk_rows))
+    chunked, chunked_time, chunked_peak = measure(
+        lambda: gs.read(sheet, chunk_rows=args.chunk_rows, max_workers=args.max_workers))
+
+    def streamed():
+        for df in gs.iter_frames(sheet, chunk_rows=args.chunk_rows, max_workers=args.max_workers):
+            pass
+    _, streamed_time, streamed_peak = measure(streamed)
+
+    assert legacy.shape == chunked.shape
+    print(f"{args.rows} rows, chunk_rows={args.chunk_rows}, latency={args.latency} s")
+    print(f"  legacy get_values + rows_to_df: {legacy_time:.2f} s, peak {legacy_peak / 2**20:.0f} MiB")
+    print(f"  read, sequential:               {sequential_time:.2f} s, peak {sequential_peak / 2**20:.0f} MiB")
+    print(f"  read, max_workers={args.max_workers}:            {chunked_time:.2f} s, peak {chunked_peak / 2**20:.0f} MiB")
+    print(f"  iter_frames, max_workers={args.max_workers}:     {streamed_time:.2f} s, peak {streamed_peak / 2**20:.0f} MiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Measures the cold-start import time of the package for a Redash-only job.
+
+Usage:
+    python benchmarks/import_time.py [--runs 5]
+
+Each measurement runs in a fresh interpreter so that nothing is cached in
+`sys.modules`. The "eager" case touches every wrapper, which is what importing
+the package root used to cost before the wrappers were loaded lazily.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = os.path.basename(REPO_ROOT)
+
+SNIPPETS = {
+    'redash_only': f"import {PACKAGE}; {PACKAGE}.Redash",
+    'eager': f"import {PACKAGE}; [getattr({PACKAGE}, name) for name in {PACKAGE}.__all__]",
+}
+
+TIMER = """
+import sys, time
+sys.path.insert(0, {parent!r})
+start = time.perf_counter()
+try:
+    exec({snippet!r})
+except ImportError as e:
+    print('error:', e)
+    sys.exit(0)
+print(time.perf_counter() - start)
+"""
+
+
+def measure(snippet: str, runs: int) -> list:
+    "Returns the import times in seconds for `runs` fresh interpreters."
+    timings = []
+    for _ in range(runs):
+        code = TIMER.format(parent=os.path.dirname(REPO_ROOT), snippet=snippet)
+        out = subprocess.run([sys.executable, '-c', code],
+                             capture_output=True, text=True, check=True).stdout.strip()
+        if out.startswith('error:'):
+            print(f"  skipped: {out[len('error: '):]}")
+            return []
+        timings.append(float(out))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    for name, snippet in SNIPPETS.items():
+        print(f"{name}: {snippet}")
+        timings = measure(snippet, args.runs)
+        if timings:
+            print(f"  median {statistics.median(timings) * 1000:.1f} ms "
+                  f"(min {min(timings) * 1000:.1f} ms, {args.runs} runs)")
+
+
+if __name__ == '__main__':
+    main()
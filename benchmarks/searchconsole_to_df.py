@@ -0,0 +1,87 @@
+"""
+Compares IbSearchConsole.to_df against the previous DataFrame-of-dicts implementation.
+
+Usage:
+    python benchmarks/searchconsole_to_df.py [--rows 500000]
+
+The response rows are synthetic, so no credentials are needed.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'searchconsole'))
+sys.path.insert(0, REPO_ROOT)  # for the modules shared by the wrappers, e.g. _disk_cache
+from src.searchconsole import IbSearchConsole  # noqa: E402
+
+DIMENSIONS = ['query', 'page', 'device']
+
+
+def legacy_to_df(response_rows, request):
+    "The implementation of `to_df` before the columnar conversion."
+    df = pd.DataFrame(response_rows)
+    keys = np.array(df['keys'].tolist())
+    if len(keys[0]) > 1:
+        for ix in range(len(keys[0])):
+            df[f'key_{ix}'] = keys[:, ix]
+        df.drop('keys', axis=1, inplace=True)
+    else:
+        df['keys'] = df['keys'].apply(lambda x: x[0])
+
+    df['startDate'] = request['startDate']
+    df['endDate'] = request['endDate']
+
+    date_cols = [col for col in df.columns if col.endswith('Date')]
+    key_cols = [col for col in df.columns if col.startswith('key')]
+    return df[date_cols + key_cols + ['clicks', 'ctr', 'impressions', 'position']]
+
+
+def make_rows(n_rows):
+    rng = np.random.default_rng(0)
+    queries = rng.integers(0, n_rows // 5, n_rows)
+    pages = rng.integers(0, 2000, n_rows)
+    devices = rng.choice(['DESKTOP', 'MOBILE', 'TABLET'], n_rows)
+    return [{'keys': [f'query {q}', f'https://www.instabase.jp/page/{p}', d],
+             'clicks': float(q % 13), 'impressions': float(q % 101 + 1),
+             'ctr': 0.1, 'position': 4.2}
+            for q, p, d in zip(queries, pages, devices)]
+
+
+def timeit(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=500_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    request = {'startDate': '2020-03-01', 'endDate': '2020-03-31', 'dimensions': DIMENSIONS}
+    sc = IbSearchConsole.__new__(IbSearchConsole)
+
+    legacy = timeit(lambda: legacy_to_df(rows, request), args.repeat)
+    columnar = timeit(lambda: sc.to_df(rows, request=request), args.repeat)
+    memory = {
+        'legacy': legacy_to_df(rows, request).memory_usage(deep=True).sum(),
+        'columnar': sc.to_df(rows, request=request).memory_usage(deep=True).sum(),
+    }
+
+    print(f"{args.rows} rows, dimensions={DIMENSIONS}")
+    print(f"  legacy:   {legacy:.3f} s, {memory['legacy'] / 2**20:.0f} MiB")
+    print(f"  columnar: {columnar:.3f} s, {memory['columnar'] / 2**20:.0f} MiB ({legacy / columnar:.1f}x faster)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Compares IbUrlFilter.parse against calling each get_* method separately.
+
+Usage:
+    python benchmarks/url_filter_parse.py [--rows 1000000] [--unique 50000]
+
+The paths are synthetic. Like a Search Console page dump, `--rows` paths are sampled
+from a pool of `--unique` distinct paths.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'searchconsole'))
+from src.ib_url_filter import IbUrlFilter  # noqa: E402
+
+PER_METHOD_CALLS = ['get_categories', 'get_features', 'get_spaces', 'get_matomes', 'get_reviews',
+                    'get_owners', 'get_prefectures', 'get_areas', 'get_wards', 'get_stations',
+                    'get_page_types']
+
+
+def make_paths(n_rows, n_unique):
+    rng = np.random.default_rng(0)
+    templates = ['/', '/{p}', '/{p}-w{n}', '/{p}-s{n}', '/{p}-w{n}-{c}', '/{p}-s{n}-{c}', '/{a}', '/{p}/{c}',
+                 '/{p}-s{n}/{c}', '/{a}/{c}-w{n}', '/space/{n}', '/matome/{n}', '/{p}/list/feature-{n}', '/reviews/{n}', '/owners/{n}',
+                 '/guides/{n}', '/privacy']
+    pool = [templates[rng.integers(len(templates))].format(p=rng.choice(IbUrlFilter.prefectures),
+                                                           a=rng.choice(IbUrlFilter.areas),
+                                                           c=rng.choice(IbUrlFilter.categories),
+                                                           n=rng.integers(1, 100_000))
+            for _ in range(n_unique)]
+    return pd.Series(pool).take(rng.integers(0, n_unique, n_rows)).reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--unique', type=int, default=50_000)
+    args = parser.parse_args()
+
+    paths = make_paths(args.rows, args.unique)
+    print(f"{args.rows} paths, {paths.nunique()} unique")
+
+    start = time.perf_counter()
+    for method in PER_METHOD_CALLS:
+        getattr(IbUrlFilter, method)(paths)
+    per_method = time.perf_counter() - start
+    print(f"  per-method calls: {per_method:.2f} s")
+
+    start = time.perf_counter()
+    IbUrlFilter.parse(paths)
+    parse = time.perf_counter() - start
+    print(f"  parse:            {parse:.2f} s ({per_method / parse:.1f}x faster)")
+
+
+if __name__ == '__main__':
+    main()
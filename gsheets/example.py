@@ -45,3 +45,9 @@ gs.concat(df, sheet)
 
 # シートの中身をdfで全て置き換える
 gs.update(sheet, df)
+
+# 大きなシートは行の範囲ごとに分けて（max_workers で並行して）読み込む。
+# 列の型は最初の sample_rows 行から推測し、dtypes で上書きできる。
+df = gs.read(sheet, chunk_rows=20_000, max_workers=4, dtypes={'date': 'datetime64[ns]'})
+for chunk in gs.iter_frames(sheet, chunk_rows=20_000):
+    print(len(chunk))
@@ -1,8 +1,11 @@
-from typing import Union, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Union, List, Optional
 import gspread
 from gspread import Spreadsheet
+from gspread.utils import rowcol_to_a1
 import pandas as pd
 import datetime
+import warnings
 import webbrowser
 from apiclient import discovery  # pip install google-api-python-client
 
@@ -16,11 +19,15 @@ class GSheets:
             - gc: google spreadsheet client. Use to get `gspread` convenience methods.
             - api: google api client using the apiclient.discovery module from `google-api-python-client`. Use for lower level configurations.
             - last_sheets_url: a url reference to the last processed Google Sheets.
+            - last_update: the number of cells and ranges written by the last `update`.
+            - last_append_range: the range written by the last `append`.
         """
         self.creds = creds
         self.gc = gspread.service_account(filename=creds)
         self.api = discovery.build('drive', 'v3', credentials=self.gc.auth)
         self.last_sheets_url = None
+        self.last_update = None
+        self.last_append_range = None
 
     def save_df(self, df: pd.DataFrame, dest: str = "0BxpY8IQbguQWa3V5blloRWFjMzA", title="Untitled") -> Spreadsheet:
         """Saves the dataframe to the destination folder ID specified, and returns the resulting file object.
@@ -31,10 +38,8 @@ class GSheets:
             - title: the title of the Google Sheet.
         """
 
-        # Convert NaN values to empty string so that Google Spreadsheet API can process it.
-        df = df.fillna('')
-
-        # Save dataframe to a new sheet
+        # Save dataframe to a new sheet.
+        # `df_to_rows` converts NaN values to empty strings so that Google Spreadsheet API can process it.
         sheets = self.gc.create(title)
         worksheet = sheets.get_worksheet(0)
         worksheet.update(self.df_to_rows(df))
@@ -55,16 +60,18 @@ class GSheets:
 
     def df_to_rows(self, df: pd.DataFrame, headers: bool = True) -> List[list]:
         """
-        Converts data frame into list of lists.
+        Converts data frame into list of lists. Missing values, including the NA of nullable dtypes, become empty cells.
         Inputs:
             - df: Data frame to convert into list of lists.
             - headers: whether to include column names.
         Returns:
             - Rows of data as list of lists.
         """
+        # `fillna('')` cannot put a string into Int64 or boolean columns, so replace missing values as objects.
+        values = df.astype(object).where(df.notna(), '').values.tolist()
         if headers:
-            return [df.columns.values.tolist()] + df.values.tolist()
-        return df.values.tolist()
+            return [df.columns.values.tolist()] + values
+        return values
 
     def rows_to_df(self, rows: List[list], headers: bool = True) -> pd.DataFrame:
         "Returns data frame from rows using first row as column names if `headers` is `True`."
@@ -78,42 +85,177 @@ class GSheets:
             df.columns = rows[0]
 
         # Convert numeric columns to numeric values if possible
-        for col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='ignore')
-        return df
+        return self._apply_dtypes(df, self._infer_dtypes(df))
 
-    def append(self, df: pd.DataFrame, sheet: Spreadsheet) -> pd.DataFrame:
-        "Append data frame data to the bottom of a given sheet."
-        current_content = sheet.get_values(
-            value_render_option='UNFORMATTED_VALUE')
+    def read(self, sheet: Spreadsheet, **kwargs) -> pd.DataFrame:
+        "Reads the whole `sheet` into a single data frame. Takes the same arguments as `iter_frames`."
+        frames = list(self.iter_frames(sheet, **kwargs))
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, axis=0, ignore_index=True)
 
-        # If the spreadsheet is empty, just append the rows.
-        if not current_content:
-            sheet.append_rows(self.df_to_rows(df, headers=True))
-            return df
+    def iter_frames(self, sheet: Spreadsheet, chunk_rows: int = 10_000, max_workers: int = 1,
+                    dtypes: Optional[dict] = None, sample_rows: int = 1000,
+                    value_render_option: str = 'UNFORMATTED_VALUE') -> Iterator[pd.DataFrame]:
+        """
+        Reads `sheet` a range of rows at a time and yields a data frame per chunk, using the first row as column names.
+        Inputs:
+            - sheet: the worksheet to read.
+            - chunk_rows: the number of rows to request at a time.
+            - max_workers: the number of chunks to request at the same time.
+            - dtypes: optional dtypes by column name, e.g. {'date': 'datetime64[ns]', 'zip': 'object'},
+            that override the inferred ones.
+            - sample_rows: the number of rows of the first chunk used to infer the dtypes of all the chunks.
+            - value_render_option: how values are rendered. See `Worksheet.get_values`.
+        Usage:
+            for df in gs.iter_frames(sheet, chunk_rows=20_000, max_workers=4):
+                df.to_parquet(...)
+        """
+        header = sheet.row_values(1, value_render_option=value_render_option)
+        if not header:
+            return
 
-        # Otherwise check if the columns align and append without column names if they do.
-        headers = current_content[0]
-        column_names_all_align = all([col == header
-                                      for col, header in zip(df.columns.tolist(), headers)])
+        n_cols = len(header)
+        chunks = [(start, min(start + chunk_rows - 1, sheet.row_count))
+                  for start in range(2, sheet.row_count + 1, chunk_rows)]
 
-        if column_names_all_align:
-            # If all of the columns names are the same, then skip adding the headers
-            sheet.append_rows(self.df_to_rows(df, headers=False))
-        else:
-            # Otherwise, add the headers so that the data is understandable
-            sheet.append_rows(self.df_to_rows(df, headers=True))
+        def fetch_chunk(chunk):
+            start, end = chunk
+            return sheet.get_values(f'{rowcol_to_a1(start, 1)}:{rowcol_to_a1(end, n_cols)}',
+                                    value_render_option=value_render_option)
+
+        schema = None
+        # Empty rows at the bottom of a range are not returned, so a short chunk does not mean that the data
+        # ends there. Every chunk up to `row_count` is read, and the missing rows are kept if data follows them.
+        n_empty_rows = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {}
+            next_ix = 0
+            for ix, (start, end) in enumerate(chunks):
+                # Keep up to `max_workers` chunks in flight, ahead of the chunk being consumed.
+                while next_ix < min(ix + max_workers, len(chunks)):
+                    futures[next_ix] = executor.submit(fetch_chunk, chunks[next_ix])
+                    next_ix += 1
+                rows = futures.pop(ix).result()
+                n_missing_rows = end - start + 1 - len(rows)
+
+                if rows:
+                    rows = [[''] * n_cols] * n_empty_rows + rows
+                    n_empty_rows = 0
+                    df = pd.DataFrame(rows).reindex(columns=range(n_cols), fill_value='')
+                    df.columns = header
+                    if schema is None:
+                        schema = dict(self._infer_dtypes(df.head(sample_rows)), **(dtypes or {}))
+                    yield self._apply_dtypes(df, schema)
+                n_empty_rows += n_missing_rows
+
+    @staticmethod
+    def _infer_dtypes(df: pd.DataFrame) -> dict:
+        """
+        Returns a dtype per column of `df`, inferred from its values. Empty cells are ignored.
+        Columns of integers become int64, or Int64 if they have empty cells, columns of
+        other numbers become float64, and columns of booleans become bool, or boolean.
+        Numbers given as strings, as in formatted values, count as numbers. Everything else is left as object.
+        """
+        dtypes = {}
+        for ix, col in enumerate(df.columns):
+            values = df.iloc[:, ix]
+            is_empty = values.isna() | (values == '')
+            values = values[~is_empty]
+            if values.empty:
+                continue
+
+            if values.map(type).eq(bool).all():
+                dtypes[col] = 'boolean' if is_empty.any() else 'bool'
+                continue
+
+            numbers = pd.to_numeric(values, errors='coerce')
+            if numbers.notna().all():
+                if (numbers % 1 == 0).all():
+                    dtypes[col] = 'Int64' if is_empty.any() else 'int64'
+                else:
+                    dtypes[col] = 'float64'
+        return dtypes
+
+    @staticmethod
+    def _apply_dtypes(df: pd.DataFrame, dtypes: dict) -> pd.DataFrame:
+        """
+        Converts the columns of `df` to `dtypes`, with empty cells as missing values.
+        Integers become Int64 and booleans become boolean if the column has empty cells, and integers become
+        float64 if the column has other numbers. A column with values that do not fit its dtype, e.g. 'A16' in a
+        column that looked like numbers in the sample, is left as it is, so that no value is lost.
+        """
+        for ix, col in enumerate(df.columns):
+            dtype = dtypes.get(col)
+            if dtype is None or dtype == 'object':
+                continue
+
+            values = df.iloc[:, ix]
+            is_empty = values.isna() | (values == '')
+            values = values.mask(is_empty)
+            if dtype in ('bool', 'boolean'):
+                fits = values[~is_empty].map(type).eq(bool).all()
+                if dtype == 'bool' and is_empty.any():
+                    dtype = 'boolean'
+            elif dtype in ('int64', 'Int64', 'float64'):
+                values = pd.to_numeric(values, errors='coerce')
+                fits = values[~is_empty].notna().all()
+                if dtype != 'float64' and not (values.dropna() % 1 == 0).all():
+                    # e.g. 1.5 in a column that looked like integers in the sample.
+                    dtype = 'float64'
+                elif dtype == 'int64' and values.isna().any():
+                    dtype = 'Int64'
+            elif str(dtype).startswith('datetime64'):
+                values = pd.to_datetime(values, errors='coerce')
+                fits = values[~is_empty].notna().all()
+            else:
+                fits = True
+
+            if not fits:
+                warnings.warn(f"Column {col!r} has values that are not {dtype}, so it is left as object.")
+                continue
+            try:
+                df.isetitem(ix, values.astype(dtype))
+            except (TypeError, ValueError):
+                continue
+        return df
 
-        # Get updated sheet content
-        current_content = self.rows_to_df(sheet.get_values())
-        return current_content
+    def append(self, df: pd.DataFrame, sheet: Spreadsheet, chunk_cells: int = 50_000) -> pd.DataFrame:
+        """
+        Append data frame data to the bottom of a given sheet.
+        Only the header row of the sheet is read, so appending to a long sheet costs the same as to a short one.
+        Inputs:
+            - df: the rows to append.
+            - sheet: the worksheet to append to.
+            - chunk_cells: the maximum number of cells sent per request, to stay well under the request size limit.
+        Returns:
+            - `df`, the appended rows. The range they were written to, e.g. "Sheet1!A1001:C1100",
+            is stored in `last_append_range`, or None if nothing was written.
+        """
+        self.last_append_range = None
+        headers = sheet.row_values(1, value_render_option='UNFORMATTED_VALUE')
+
+        # If the spreadsheet is empty, or the columns do not align, add the headers so that the data is understandable.
+        # Otherwise, if all of the columns names are the same, then skip adding the headers.
+        column_names_all_align = bool(headers) and all([col == header
+                                                        for col, header in zip(df.columns.tolist(), headers)])
+        rows = self.df_to_rows(df, headers=not column_names_all_align)
+
+        chunk_rows = max(1, chunk_cells // max(1, len(df.columns)))
+        updated_ranges = []
+        for start in range(0, len(rows), chunk_rows):
+            response = sheet.append_rows(rows[start:start + chunk_rows])
+            updated_ranges.append(response['updates']['updatedRange'])
+
+        if updated_ranges:
+            self.last_append_range = f"{updated_ranges[0].split(':')[0]}:{updated_ranges[-1].split(':')[-1]}"
+        return df
 
     def concat(self, df: pd.DataFrame, sheet: Spreadsheet) -> pd.DataFrame:
         "Concatenates `df` with existing content of `sheet`."
-        current_content = self.rows_to_df(sheet.get_values(
-            value_render_option='UNFORMATTED_VALUE'))
-        updated_content = pd.concat([current_content, df], axis=0)
-        self.update(sheet, updated_content)
+        current_rows = sheet.get_values(value_render_option='UNFORMATTED_VALUE')
+        updated_content = pd.concat([self.rows_to_df(current_rows), df], axis=0)
+        self.update(sheet, updated_content, current_rows=current_rows)
         return updated_content
 
     def drop_duplicates(self, sheet: Spreadsheet, columns: Optional[list] = None) -> pd.DataFrame:
@@ -121,27 +263,90 @@ class GSheets:
         if isinstance(columns, str):
             columns = [columns]
 
-        current_content = self.rows_to_df(sheet.get_values(
-            value_render_option='UNFORMATTED_VALUE'))
-        updated_content = current_content.drop_duplicates(columns, keep='last')
-        self.update(sheet, updated_content)
+        current_rows = sheet.get_values(value_render_option='UNFORMATTED_VALUE')
+        updated_content = self.rows_to_df(current_rows).drop_duplicates(columns, keep='last')
+        self.update(sheet, updated_content, current_rows=current_rows)
         return updated_content
 
     def sort_values(self, sheet: Spreadsheet, column: str, ascending: bool = True) -> pd.DataFrame:
         "Sorts the spreadsheet by `column`."
-        current_content = self.rows_to_df(sheet.get_values(
-            value_render_option='UNFORMATTED_VALUE'))
-        updated_content = current_content.sort_values(column, ascending=ascending)\
+        current_rows = sheet.get_values(value_render_option='UNFORMATTED_VALUE')
+        updated_content = self.rows_to_df(current_rows).sort_values(column, ascending=ascending)\
             .reset_index(drop=True)
-        self.update(sheet, updated_content)
+        self.update(sheet, updated_content, current_rows=current_rows)
         return updated_content
 
-    def update(self, sheet: Spreadsheet, df: pd.DataFrame) -> pd.DataFrame:
-        "Updates given `sheet` with contents of `df`. Previous content is overwritten."
-        sheet.clear()
-        sheet.update(self.df_to_rows(df.fillna('')))
+    def update(self, sheet: Spreadsheet, df: pd.DataFrame, diff: bool = True,
+               current_rows: Optional[List[list]] = None) -> pd.DataFrame:
+        """
+        Updates given `sheet` with contents of `df`. Previous content is overwritten.
+        Inputs:
+            - sheet: the worksheet to update.
+            - df: the new contents of the sheet, including column names.
+            - diff: only write the cells that differ from the current contents, in a single
+            batch update, instead of clearing the sheet and writing every cell. The sheet is
+            never left empty, and is only resized if `df` does not fit. Cells outside of `df`
+            are blanked. The number of cells and ranges written is stored in `last_update`.
+            - current_rows: the current contents of the sheet, as returned by `get_values` with
+            UNFORMATTED_VALUE, if they were just read. Otherwise they are read again for `diff`.
+        """
+        new_rows = self.df_to_rows(df)
+        if not diff:
+            sheet.clear()
+            sheet.update(new_rows)
+            self.last_update = {'ranges': 1, 'cells': sum(len(row) for row in new_rows)}
+            return df
+
+        if current_rows is None:
+            current_rows = sheet.get_values(value_render_option='UNFORMATTED_VALUE')
+        data = self._diff_ranges(current_rows, new_rows)
+
+        n_rows = len(new_rows)
+        n_cols = max((len(row) for row in new_rows), default=0)
+        if n_rows > sheet.row_count or n_cols > sheet.col_count:
+            sheet.resize(rows=max(n_rows, sheet.row_count), cols=max(n_cols, sheet.col_count))
+
+        if data:
+            sheet.batch_update(data)
+        self.last_update = {'ranges': len(data),
+                            'cells': sum(len(block['values']) * len(block['values'][0]) for block in data)}
+        print(f"Updated {self.last_update['cells']} cells in {self.last_update['ranges']} ranges.")
         return df
 
+    @staticmethod
+    def _diff_ranges(current_rows: List[list], new_rows: List[list]) -> List[dict]:
+        """
+        Returns the ranges of `new_rows` that differ from `current_rows`, as data for `Worksheet.batch_update`.
+        Each row is written from its first to its last changed cell, and consecutive rows that
+        change the same columns are merged into one range. Cells that are only in `current_rows` are blanked.
+        """
+        n_cols = max([len(row) for row in current_rows] + [len(row) for row in new_rows] + [0])
+
+        # (first row, last row, first column, last column, values), 0-indexed.
+        blocks = []
+        for ix in range(max(len(current_rows), len(new_rows))):
+            current = current_rows[ix] if ix < len(current_rows) else []
+            new = new_rows[ix] if ix < len(new_rows) else []
+            current = list(current) + [''] * (n_cols - len(current))
+            new = list(new) + [''] * (n_cols - len(new))
+
+            # 1 == True and 0 == False in Python, but not in a sheet, so a bool vs non-bool is a change.
+            changed = [col for col in range(n_cols)
+                       if current[col] != new[col] or isinstance(current[col], bool) != isinstance(new[col], bool)]
+            if not changed:
+                continue
+            first, last = changed[0], changed[-1]
+            values = new[first:last + 1]
+            if blocks and blocks[-1][1] == ix - 1 and blocks[-1][2] == first and blocks[-1][3] == last:
+                blocks[-1][1] = ix
+                blocks[-1][4].append(values)
+            else:
+                blocks.append([ix, ix, first, last, [values]])
+
+        return [{'range': f'{rowcol_to_a1(top + 1, left + 1)}:{rowcol_to_a1(bottom + 1, right + 1)}',
+                 'values': values}
+                for top, bottom, left, right, values in blocks]
+
     def share(self, sheets: Spreadsheet, emails: Union[str, List[str]]) -> None:
         if not isinstance(emails, list):
             emails = [emails]
@@ -0,0 +1,171 @@
+# Run from top of module
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.append('./')
+from gsheets import GSheets
+from gspread.utils import a1_to_rowcol, rowcol_to_a1
+
+
+class FakeWorksheet:
+    """
+    An in-memory stand-in for a gspread Worksheet.
+    Like the Sheets API, `get_values` does not return the empty rows at the bottom of the requested range.
+    """
+
+    def __init__(self, rows, row_count=1000, col_count=26):
+        self.cells = {(r, c): value for r, row in enumerate(rows) for c, value in enumerate(row)}
+        self.row_count = row_count
+        self.col_count = col_count
+        self.calls = []
+
+    def _rows(self, first=1, last=None):
+        n_cols = max((c for _, c in self.cells), default=-1) + 1
+        last = self.row_count if last is None else last
+        rows = [[self.cells.get((r, c), '') for c in range(n_cols)] for r in range(first - 1, last)]
+        while rows and all(value == '' for value in rows[-1]):
+            rows.pop()
+        return rows
+
+    def get_values(self, range_name=None, **kwargs):
+        self.calls.append('get_values')
+        if range_name is None:
+            return self._rows()
+        start, end = range_name.split(':')
+        return self._rows(a1_to_rowcol(start)[0], a1_to_rowcol(end)[0])
+
+    def row_values(self, row, **kwargs):
+        self.calls.append('row_values')
+        rows = self._rows(row, row)
+        return rows[0] if rows else []
+
+    def batch_update(self, data, **kwargs):
+        self.calls.append('batch_update')
+        for block in data:
+            top, left = a1_to_rowcol(block['range'].split(':')[0])
+            for r, row in enumerate(block['values']):
+                for c, value in enumerate(row):
+                    self.cells[(top - 1 + r, left - 1 + c)] = value
+
+    def append_rows(self, values, **kwargs):
+        self.calls.append('append_rows')
+        top = len(self._rows()) + 1
+        for r, row in enumerate(values):
+            for c, value in enumerate(row):
+                self.cells[(top - 1 + r, c)] = value
+        return {'updates': {'updatedRange': f'Sheet1!A{top}:{rowcol_to_a1(top + len(values) - 1, len(values[0]))}'}}
+
+    def resize(self, rows=None, cols=None):
+        self.calls.append('resize')
+        self.row_count, self.col_count = rows, cols
+
+
+def test_update_should_write_back_rows_with_empty_cells():
+    rows = [['id', 'price', 'open', 'name'],
+            [1, 1000, True, 'a'],
+            [2, '', '', 'b'],
+            [3, 3000, False, '']]
+    sheet = FakeWorksheet(rows)
+    gs = GSheets.__new__(GSheets)
+
+    df = gs.rows_to_df(sheet.get_values())
+    assert str(df['price'].dtype) == 'Int64'
+    assert str(df['open'].dtype) == 'boolean'
+
+    gs.update(sheet, df)
+    assert sheet.get_values() == rows
+    assert gs.last_update == {'ranges': 0, 'cells': 0}
+
+    gs.update(sheet, df.sort_values('id', ascending=False))
+    assert sheet.get_values() == [rows[0]] + rows[:0:-1]
+
+
+def test_df_to_rows_should_turn_missing_values_into_empty_cells():
+    df = pd.DataFrame({'a': pd.array([1, None], dtype='Int64'), 'b': [1.5, None], 'c': ['x', None]})
+    assert GSheets.__new__(GSheets).df_to_rows(df) == [['a', 'b', 'c'], [1, 1.5, 'x'], ['', '', '']]
+
+
+def test_read_should_not_stop_at_empty_rows_between_chunks():
+    rows = [['id', 'name']] + [[i, f'row {i}'] if i % 5 else ['', ''] for i in range(1, 25)] + [['', '']] * 3
+    sheet = FakeWorksheet(rows, row_count=40)
+    gs = GSheets.__new__(GSheets)
+
+    for max_workers in (1, 3):
+        df = gs.read(sheet, chunk_rows=5, max_workers=max_workers)
+        pd.testing.assert_frame_equal(df, gs.rows_to_df(sheet.get_values()))
+        assert len(df) == 24
+        assert df['id'].dropna().tolist() == [i for i in range(1, 25) if i % 5]
+
+
+def test_infer_dtypes_should_ignore_empty_cells():
+    df = pd.DataFrame({'int': [1, 2, 3], 'nullable_int': [1, '', 3], 'float': ['1.5', 2, ''],
+                       'bool': [True, False, True], 'nullable_bool': [True, '', False],
+                       'str': ['a', 1, ''], 'empty': ['', '', '']})
+    assert GSheets._infer_dtypes(df) == {'int': 'int64', 'nullable_int': 'Int64', 'float': 'float64',
+                                         'bool': 'bool', 'nullable_bool': 'boolean'}
+
+
+def test_read_should_keep_values_that_do_not_fit_the_sampled_dtypes():
+    rows = [['zip', 'open', 'score']] + [[i, True, i] for i in range(1, 11)] \
+        + [['A16', '', 1.5], [17, False, '']]
+    sheet = FakeWorksheet(rows, row_count=20)
+    gs = GSheets.__new__(GSheets)
+
+    with pytest.warns(UserWarning, match="'zip'"):
+        first, second = gs.iter_frames(sheet, chunk_rows=10, sample_rows=5)
+    assert first['zip'].dtype == 'int64'
+    assert second['zip'].tolist() == ['A16', 17]
+    assert str(second['open'].dtype) == 'boolean'
+    assert second['open'].tolist() == [pd.NA, False]
+    assert second['score'].dtype == 'float64'
+    assert second['score'].tolist()[0] == 1.5
+
+
+def test_diff_ranges_should_merge_rows_that_change_the_same_columns():
+    current_rows = [['id', 'name', 'price'], [1, 'a', 100], [2, 'b', 200], [3, 'c', 300], [4, 'd', 400]]
+    new_rows = [['id', 'name', 'price'], [1, 'a', 150], [2, 'b', 250], [3, 'c', 300], [4, 'x', 450]]
+    assert GSheets._diff_ranges(current_rows, new_rows) == [
+        {'range': 'C2:C3', 'values': [[150], [250]]},
+        {'range': 'B5:C5', 'values': [['x', 450]]},
+    ]
+    assert GSheets._diff_ranges(current_rows, current_rows) == []
+
+
+def test_diff_ranges_should_write_booleans_over_equal_numbers():
+    current_rows = [['a', 'b'], [1, 1], [0, 2]]
+    new_rows = [['a', 'b'], [True, 1.0], [False, 2]]
+    assert GSheets._diff_ranges(current_rows, new_rows) == [{'range': 'A2:A3', 'values': [[True], [False]]}]
+    assert GSheets._diff_ranges(new_rows, current_rows) == [{'range': 'A2:A3', 'values': [[1], [0]]}]
+
+
+def test_diff_ranges_should_blank_cells_outside_of_new_rows():
+    current_rows = [['id', 'name', 'memo'], [1, 'a', 'x'], [2, 'b', '']]
+    new_rows = [['id', 'name'], [1, 'a']]
+    assert GSheets._diff_ranges(current_rows, new_rows) == [
+        {'range': 'C1:C2', 'values': [[''], ['']]},
+        {'range': 'A3:B3', 'values': [['', '']]},
+    ]
+
+
+def test_drop_duplicates_should_read_the_sheet_once():
+    sheet = FakeWorksheet([['id', 'name'], [1, 'a'], [2, 'b'], [1, 'c']])
+    gs = GSheets.__new__(GSheets)
+
+    gs.drop_duplicates(sheet, 'id')
+    assert sheet.calls == ['get_values', 'batch_update']
+    assert sheet.get_values() == [['id', 'name'], [2, 'b'], [1, 'c']]
+
+
+def test_append_should_reset_the_range_when_nothing_is_written():
+    sheet = FakeWorksheet([['id', 'name'], [1, 'a']])
+    gs = GSheets.__new__(GSheets)
+
+    gs.append(pd.DataFrame({'id': [2, 3], 'name': ['b', 'c']}), sheet)
+    assert gs.last_append_range == 'Sheet1!A3:B4'
+    assert sheet.get_values() == [['id', 'name'], [1, 'a'], [2, 'b'], [3, 'c']]
+
+    gs.append(pd.DataFrame({'id': [], 'name': []}), sheet)
+    assert gs.last_append_range is None
+    assert sheet.calls.count('append_rows') == 1
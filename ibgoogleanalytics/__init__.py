@@ -1 +1 @@
-from .src import GoogleAnalytics
+from .src import GoogleAnalytics, GoogleAnalyticsCache
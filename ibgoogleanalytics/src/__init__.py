@@ -1 +1,2 @@
 from .googleanalytics import GoogleAnalytics
+from .cache import GoogleAnalyticsCache
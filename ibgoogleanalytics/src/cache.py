@@ -0,0 +1,81 @@
+import datetime
+import json
+import time
+from typing import Optional
+
+try:
+	from ..._disk_cache import DiskCache
+except ImportError:
+	# `src` was imported on its own, as in the benchmarks, with the repository root on sys.path.
+	from _disk_cache import DiskCache
+
+
+class GoogleAnalyticsCache(DiskCache):
+	"""
+	An on-disk cache for raw Google Analytics API v4 responses.
+
+	Entries are keyed on the normalized `batchGet` body, with relative dates such as '7daysAgo'
+	already resolved by `GoogleAnalytics`, so '7daysAgo' asked today and tomorrow are different entries.
+	Google Analytics keeps processing the last day or two of data, so:
+		* responses whose date ranges all end more than `mutable_days` days before the day they
+		were fetched are final and never expire.
+		* everything else expires `ttl` seconds after it was fetched.
+	When the cache grows over `max_bytes`, the least recently used entries are evicted.
+	Each entry is a single JSON file with the response and when it was fetched.
+
+	Usage:
+		cache = GoogleAnalyticsCache('./cache/googleanalytics')
+		ga = GoogleAnalytics(credentials, 'マネオ', cache=cache)
+		ga.get_df(metrics=['ga:sessions'], date_ranges=[{'startDate': '2020-03-01', 'endDate': '2020-03-31'}])
+		cache.stats()
+	"""
+	data_suffix = '.json'
+	meta_suffix = None
+
+	def __init__(self, directory: str, max_bytes: int =2**30, mutable_days: int =2, ttl: int =6 * 60 * 60) -> None:
+		"""
+		Input:
+			- directory: where to store the cached responses. Created if it does not exist.
+			- max_bytes: the maximum total size of the cached responses.
+			- mutable_days: the number of most recent days that Google Analytics may still revise.
+			- ttl: how many seconds responses that include mutable days are kept for.
+		"""
+		super().__init__(directory, max_bytes)
+		self.mutable_days = mutable_days
+		self.ttl = ttl
+
+	def key(self, body: dict) -> str:
+		"Returns the cache key for a normalized `batchGet` body."
+		return self._hash(body)
+
+	def get(self, key: str) -> Optional[dict]:
+		"Returns the cached response for `key`, or None if it is missing or expired."
+		entry = self._load_json(self._paths(key)[0])
+		if entry is not None and not entry['final'] and time.time() - entry['fetched_at'] > self.ttl:
+			self._remove(key)
+			entry = None
+		if entry is None:
+			self._count(hit=False)
+			return None
+
+		self._touch(key)
+		self._count(hit=True)
+		return entry['response']
+
+	def put(self, key: str, body: dict, response: dict) -> None:
+		"Stores `response` as the result of the normalized `body` under `key`, then evicts entries over `max_bytes`."
+		fetched_on = datetime.date.today()
+		end_dates = [date_range['endDate'] for report_request in body['reportRequests']
+					for date_range in report_request.get('dateRanges', [])]
+		last_date = max(datetime.datetime.strptime(date, '%Y-%m-%d').date() for date in end_dates) \
+			if end_dates else fetched_on
+		entry = {
+			'fetched_at': time.time(),
+			'final': last_date < fetched_on - datetime.timedelta(days=self.mutable_days),
+			'response': response,
+		}
+
+		def write_entry(path):
+			with open(path, 'w') as f:
+				json.dump(entry, f, ensure_ascii=False)
+		self._write(key, write_entry)
@@ -1,9 +1,20 @@
+import datetime
+import json
+import re
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from operator import itemgetter
+from typing import Optional
+
 from apiclient.discovery import build
 from google.oauth2 import service_account
 import pandas as pd
 import numpy as np
 from retry import retry
 
+from .cache import GoogleAnalyticsCache
+
 class GoogleAnalytics:
 	"""
 	Wrapper for the Google Analytics API v4.
@@ -12,33 +23,126 @@ class GoogleAnalytics:
 		* https://ga-dev-tools.appspot.com/dimensions-metrics-explorer/
 		* https://ga-dev-tools.appspot.com/query-explorer/ # Especially useful for getting segmentId
 	"""
-	def __init__(self, credentials, ga_view_id: str):
+	max_batch_size = 5 # The maximum number of reportRequests in a single batchGet call.
+	# Metrics that cannot be summed across date ranges, besides averages, ratios and rates.
+	non_additive_metrics = {'ga:users', 'ga:1dayUsers', 'ga:7dayUsers', 'ga:14dayUsers', 'ga:28dayUsers', 'ga:30dayUsers'}
+
+	def __init__(self, credentials, ga_view_id: str, cache: Optional[GoogleAnalyticsCache] =None, history_size: int =10):
+		"""
+		Input:
+			- credentials: path to the service account credentials JSON file.
+			- ga_view_id: the name of the view, e.g. 'マネオ'.
+			- cache: optional GoogleAnalyticsCache to reuse responses across calls and sessions.
+			- history_size: the number of most recent responses kept in `self.res`.
+		"""
 		self.credentials = service_account.Credentials.from_service_account_file(credentials)
 		self.scoped_credentials = self.credentials.with_scopes(['https://www.googleapis.com/auth/analytics.readonly'])
 		self.api = build('analyticsreporting', 'v4', credentials=self.scoped_credentials)
+		self._local = threading.local()
 		view_id_dic = {"こどものみらい":"?","マネオ":"238474972","おすすめセレクト":"234650494"}
 		self.ga_view_id = view_id_dic[ga_view_id]
 		self.req = ""
-		self.res = []
+		self.history_size = history_size
+		self.res = deque(maxlen=history_size)
+		self.cache = cache
+		self._in_flight = {}
+		self._in_flight_lock = threading.Lock()
+
+	def _execute(self, body: dict, api=None, num_retries: int =0) -> dict:
+		"""
+		Sends a `batchGet` request and returns the response.
+
+		Responses come from the cache when there is one. Concurrent calls with the same body,
+		e.g. from several threads, share a single API call instead of each sending their own.
+		"""
+		normalized = self._normalize_body(body)
+		key = json.dumps(normalized, sort_keys=True, default=str)
+
+		with self._in_flight_lock:
+			future = self._in_flight.get(key)
+			is_owner = future is None
+			if is_owner:
+				future = self._in_flight[key] = Future()
+		if not is_owner:
+			return future.result()
+
+		try:
+			cache_key = self.cache.key(normalized) if self.cache is not None else None
+			res = self.cache.get(cache_key) if self.cache is not None else None
+			if res is None:
+				res = (api or self.api).reports().batchGet(body=body).execute(num_retries=num_retries)
+				if self.cache is not None:
+					self.cache.put(cache_key, normalized, res)
+			future.set_result(res)
+		except Exception as e:
+			future.set_exception(e)
+			raise
+		finally:
+			with self._in_flight_lock:
+				del self._in_flight[key]
+
+		self.res.append(res)
+		return res
+
+	def _normalize_body(self, body: dict) -> dict:
+		"Returns a copy of a `batchGet` body with relative dates such as '7daysAgo' resolved, for use as a key."
+		today = datetime.date.today()
+		report_requests = []
+		for report_request in body['reportRequests']:
+			date_ranges = [{key: self._resolve_date(value, today=today).strftime('%Y-%m-%d')
+							for key, value in date_range.items()}
+						for date_range in report_request.get('dateRanges', [])]
+			report_requests.append(dict(report_request, dateRanges=date_ranges))
+		return dict(body, reportRequests=report_requests)
+
+	def _thread_api(self):
+		"""Returns an API client owned by the current thread.
+		The discovery client is not thread-safe, so every worker thread builds its own."""
+		if not hasattr(self._local, 'api'):
+			self._local.api = build('analyticsreporting', 'v4', credentials=self.scoped_credentials)
+		return self._local.api
 
 	def get_all(self, *args, **kwargs) -> pd.DataFrame:
+		"""
+		Gets every page of a report and returns them as a single DataFrame.
+		Takes the same arguments as `get_df`. See `iter_dfs` for a streaming version.
+		"""
 		self.reset()
 
-		batch_size = 100000
-
-		df = self.get_df(*args, **kwargs)
-		dfs = df
-		while len(df) == batch_size:
-			try:
-				df = self.get_df(*args, offset=str(batch_size), **kwargs)
-				dfs = pd.concat([dfs, df], axis=0)
+		dfs = []
+		try:
+			for df in self.iter_dfs(*args, **kwargs):
+				dfs.append(df)
 				print(".", end='')
-			except:
-				print("Something went wrong. Returning intermediate resluts.")
-				break
-		return dfs
+		except TypeError:
+			# Wrong arguments, not a failed request, so there is nothing worth returning.
+			raise
+		except Exception as e:
+			print(f"Something went wrong. Returning intermediate results. {e}")
+
+		# Concatenate once at the end rather than once per page.
+		if not dfs:
+			return pd.DataFrame()
+		return pd.concat(dfs, axis=0)
+
+	def iter_dfs(self, *args, **kwargs):
+		"""
+		Yields one DataFrame per page of a report, following the `nextPageToken` returned by the API
+		until there are no more pages. Takes the same arguments as `get_df`.
+
+		Usage:
+			for df in ga.iter_dfs(metrics=['ga:pageviews'], dimensions=['ga:date', 'ga:pagePath']):
+				df.to_csv('pageviews.csv', mode='a')
+		"""
+		page_token = str(kwargs.pop('offset', '0'))
+		while page_token:
+			res = self._get_page(*args, offset=page_token, **kwargs)
+			report = res['reports'][0]
+			if not report['data'].get('rows'):
+				return
+			yield self.to_df(res)
+			page_token = report.get('nextPageToken')
 
-	@retry(tries=3, delay=2, backoff=2)
 	def get_df(self, 	metrics:list =['ga:sessions'],
 					dimensions:list =['ga:date'],
 					date_ranges:list =[{'startDate': '7daysAgo', 'endDate': 'today'}],
@@ -47,12 +151,28 @@ class GoogleAnalytics:
 					page_size:int =100000,
 					offset:str ='0',
 					segments:list =[],
-					filters_expression="") -> pd.DataFrame:
-		"A method that simplifies how to specify metrics and dimensions variables."
-		metrics = [{'expression': metric} for metric in metrics]
-		dimensions = [{'name': dim} for dim in dimensions]
+					filters_expression="",
+					shard=None,
+					max_workers:int =4,
+					aggfunc=None) -> pd.DataFrame:
+		"""
+		A method that simplifies how to specify metrics and dimensions variables.
+		Use `shard='day'` or `shard='week'` to get a long date range unsampled, see `get_sharded`.
+		"""
+		if shard is not None:
+			return self.get_sharded(metrics=metrics,
+					dimensions=dimensions,
+					date_ranges=date_ranges,
+					sort_by=sort_by,
+					sort_order=sort_order,
+					page_size=page_size,
+					segments=segments,
+					filters_expression=filters_expression,
+					shard=shard,
+					max_workers=max_workers,
+					aggfunc=aggfunc)
 
-		res = self.get_res(metrics=metrics,
+		res = self._get_page(metrics=metrics,
 					dimensions=dimensions,
 					date_ranges=date_ranges,
 					sort_by=sort_by,
@@ -64,6 +184,37 @@ class GoogleAnalytics:
 
 		return self.to_df(res)
 
+	def _get_page(self, 	metrics:list =['ga:sessions'],
+					dimensions:list =['ga:date'],
+					date_ranges:list =[{'startDate': '7daysAgo', 'endDate': 'today'}],
+					sort_by=None,
+					sort_order=None,
+					page_size:int =100000,
+					offset:str ='0',
+					segments:list =[],
+					filters_expression="") -> dict:
+		"""
+		Gets a single page of a report, with metrics and dimensions given as names. Raises if the request fails.
+		Takes the same arguments as `get_df`, in the same order, except for the sharding ones.
+		"""
+		return self._get_res_or_raise(metrics=[{'expression': metric} for metric in metrics],
+					dimensions=[{'name': dim} for dim in dimensions],
+					date_ranges=date_ranges,
+					sort_by=sort_by,
+					sort_order=sort_order,
+					page_size=page_size,
+					offset=offset,
+					segments=segments,
+					filters_expression=filters_expression)
+
+	@retry(tries=3, delay=2, backoff=2)
+	def _get_res_or_raise(self, **kwargs) -> dict:
+		"Calls `get_res`, retrying failed requests."
+		res = self.get_res(**kwargs)
+		if isinstance(res, Exception):
+			raise res
+		return res
+
 	def get_res(self, 	metrics=[{'expression': 'ga:sessions'}],
 					dimensions=[{'name': 'ga:date'}],
 					date_ranges=[{'startDate': '7daysAgo', 'endDate': 'today'}],
@@ -94,6 +245,35 @@ class GoogleAnalytics:
 
 		"""
 
+		self.req = {'reportRequests': [self._build_report_request(metrics=metrics,
+						dimensions=dimensions,
+						date_ranges=date_ranges,
+						sort_by=sort_by,
+						sort_order=sort_order,
+						page_size=page_size,
+						offset=offset,
+						segments=segments,
+						filters_expression=filters_expression)]}
+		try:
+			res = self._execute(self.req)
+		except Exception as e:
+			res = e
+			print(res)
+			self.res.append(res)
+
+		return res
+
+	def _build_report_request(self, 	metrics=[{'expression': 'ga:sessions'}],
+					dimensions=[{'name': 'ga:date'}],
+					date_ranges=[{'startDate': '7daysAgo', 'endDate': 'today'}],
+					sort_by=None,
+					sort_order=None,
+					page_size=100000,
+					offset='0',
+					segments=[],
+					filters_expression="") -> dict:
+		"Builds a single entry of `reportRequests`. See `get_res` for the arguments."
+
 		# Supply default values for the API request.
 		assert len(metrics) > 0, "Metrics is empty. Specify at least one metric."
 		if sort_by is None:
@@ -114,82 +294,281 @@ class GoogleAnalytics:
 			if {'name': 'ga:segment'} not in dimensions:
 				dimensions.append({'name': 'ga:segment'})
 
-		self.req = {
-			'reportRequests': [{
-				'viewId': self.ga_view_id,
-				'dateRanges': date_ranges,
-				'metrics': metrics,
-				'dimensions': dimensions,
-				'pageSize': page_size, # Maximum allowed under API
-				'pageToken': offset,
-				'orderBys': [
-					{
-						'fieldName': sort_by,
-						'orderType': 'VALUE',
-						'sortOrder': sort_order
-					}
-				],
-				'hideTotals': True,
-  				'hideValueRanges': True,
-				'segments': segments,
-				'filtersExpression': filters_expression
-			}]
+		return {
+			'viewId': self.ga_view_id,
+			'dateRanges': date_ranges,
+			'metrics': metrics,
+			'dimensions': dimensions,
+			'pageSize': page_size, # Maximum allowed under API
+			'pageToken': offset,
+			'orderBys': [
+				{
+					'fieldName': sort_by,
+					'orderType': 'VALUE',
+					'sortOrder': sort_order
+				}
+			],
+			'hideTotals': True,
+			'hideValueRanges': True,
+			'segments': segments,
+			'filtersExpression': filters_expression
 		}
-		try:
-			res = self.api.reports().batchGet(body=self.req).execute()
-			self.res.append(res)
-		except Exception as e:
-			res = e
-			print(res)
-			self.res.append(res)
 
-		return res
+	def batch_get_dfs(self, specs: list, max_workers: int =4) -> list:
+		"""
+		Gets many reports with as few API calls as possible and returns one DataFrame per spec, in the same order.
+
+		Reports that share `date_ranges` and `segments` are packed into `batchGet` calls of up to five
+		reports each, as the API requires, and the calls run concurrently on `max_workers` threads.
+		Reports with more rows than `page_size` are paged through `nextPageToken` within the same batch.
+
+		Input:
+			- specs: list of dictionaries with the same keys as the arguments of `get_df`.
+			- max_workers: the number of concurrent `batchGet` calls. Google Analytics allows up to 10 per view.
+
+		Usage:
+			sessions, pageviews = ga.batch_get_dfs([
+				{'metrics': ['ga:sessions'], 'dimensions': ['ga:date']},
+				{'metrics': ['ga:pageviews'], 'dimensions': ['ga:pagePath']},
+			])
+		"""
+		report_requests = [self._report_request_from_spec(spec) for spec in specs]
+
+		# Reports in a single batchGet must have the same dateRanges and segments.
+		groups = {}
+		for ix, report_request in enumerate(report_requests):
+			key = json.dumps([report_request['dateRanges'], report_request['segments']], sort_keys=True)
+			groups.setdefault(key, []).append(ix)
+		batches = [ixs[i:i + self.max_batch_size] for ixs in groups.values()
+					for i in range(0, len(ixs), self.max_batch_size)]
+
+		def fetch_batch(ixs):
+			return ixs, self._batch_get([report_requests[ix] for ix in ixs], api=self._thread_api())
+
+		dfs = [None] * len(specs)
+		with ThreadPoolExecutor(max_workers=max_workers) as executor:
+			for ixs, frames in executor.map(fetch_batch, batches):
+				for ix, df in zip(ixs, frames):
+					dfs[ix] = df
+		return dfs
+
+	def _report_request_from_spec(self, spec: dict) -> dict:
+		"Builds a report request from `get_df` style arguments, i.e. metrics and dimensions given as names."
+		spec = dict(spec)
+		spec['metrics'] = [{'expression': metric} for metric in spec.get('metrics', ['ga:sessions'])]
+		spec['dimensions'] = [{'name': dim} for dim in spec.get('dimensions', ['ga:date'])]
+		return self._build_report_request(**spec)
+
+	def _batch_get(self, report_requests: list, api=None) -> list:
+		"""
+		Sends up to five report requests in one `batchGet` call, then keeps asking for the next pages of
+		the reports that have more. Returns one DataFrame per report request.
+		"""
+		api = api or self.api
+		report_requests = list(report_requests)
+		pages = [[] for _ in report_requests]
+
+		pending = list(range(len(report_requests)))
+		while pending:
+			body = {'reportRequests': [report_requests[ix] for ix in pending]}
+			res = self._execute(body, api=api, num_retries=5)
+
+			next_pending = []
+			for ix, report in zip(pending, res['reports']):
+				if report['data'].get('rows'):
+					pages[ix].append(self._report_to_df(report, report_requests[ix]))
+				if report.get('nextPageToken'):
+					report_requests[ix] = dict(report_requests[ix], pageToken=report['nextPageToken'])
+					next_pending.append(ix)
+			pending = next_pending
+
+		return [pd.concat(frames, axis=0) if frames else pd.DataFrame() for frames in pages]
+
+	def get_sharded(self, metrics:list =['ga:sessions'],
+					dimensions:list =['ga:date'],
+					date_ranges:list =[{'startDate': '7daysAgo', 'endDate': 'today'}],
+					shard='week',
+					max_workers:int =4,
+					aggfunc=None,
+					**kwargs) -> pd.DataFrame:
+		"""
+		Splits the date range into shards, gets every shard on a worker pool and merges the results.
+
+		Google Analytics samples reports over long date ranges. Each shard is requested with
+		`samplingLevel: LARGE`, and a shard whose response still has `samplesReadCounts` is split
+		in half and requested again, down to single days.
+
+		Input:
+			- metrics, dimensions, date_ranges and other keyword arguments: see `get_df`. Only a single date range is supported.
+			- shard: 'day', 'week' or a number of days per shard.
+			- max_workers: the number of shards requested concurrently. Google Analytics allows up to 10 per view.
+			- aggfunc: how to merge rows of the same dimensions from different shards, as accepted by `DataFrame.agg`.
+			Defaults to summing, which is only right for metrics that add up across days. A ValueError is raised
+			instead for other metrics, such as ga:users, averages, ratios and PERCENT or FLOAT metrics, unless
+			`aggfunc` is given, e.g. {'ga:sessions': 'sum', 'ga:users': 'max'}, or ga:date is one of the dimensions.
+			Shards are not merged when ga:date is one of the dimensions, since every row then belongs to a single shard.
+		Output:
+			- Pandas DataFrame.
+		"""
+		assert len(date_ranges) == 1, "Sharding supports a single date range only."
+		shard_days = {'day': 1, 'week': 7}.get(shard, shard)
+		assert isinstance(shard_days, int) and shard_days > 0, "Invalid shard. Choose from 'day', 'week' or a number of days."
+
+		start_date = self._resolve_date(date_ranges[0]['startDate'])
+		end_date = self._resolve_date(date_ranges[0]['endDate'])
+		report_request = self._report_request_from_spec(dict(kwargs, metrics=metrics, dimensions=dimensions,
+														date_ranges=date_ranges))
+		report_request['samplingLevel'] = 'LARGE'
+
+		shards = []
+		while start_date <= end_date:
+			shard_end = min(start_date + datetime.timedelta(days=shard_days - 1), end_date)
+			shards.append((start_date, shard_end))
+			start_date = shard_end + datetime.timedelta(days=1)
+
+		dimension_names = [dim['name'] for dim in report_request['dimensions']]
+		metric_names = [metric['expression'] for metric in report_request['metrics']]
+		if 'ga:date' not in dimension_names and len(shards) > 1 and aggfunc is None:
+			# Check the names before spending any quota. The types are checked once the responses are in.
+			self._check_additive(metric_names)
+
+		def fetch_shard(dates):
+			return self._get_unsampled(report_request, *dates, api=self._thread_api())
+
+		with ThreadPoolExecutor(max_workers=max_workers) as executor:
+			frames = [df for dfs in executor.map(fetch_shard, shards) for df in dfs]
+
+		frames = [df for df in frames if len(df)]
+		if not frames:
+			return pd.DataFrame()
+		df = pd.concat(frames, axis=0, ignore_index=True)
+
+		# Rows of the same dimensions come from different shards, or from halves of a sampled shard.
+		if 'ga:date' not in dimension_names and df.duplicated(dimension_names).any():
+			if aggfunc is None:
+				self._check_additive(metric_names, frames[0].attrs.get('metric_types', {}))
+			df = df.groupby(dimension_names, sort=False)[metric_names].agg(aggfunc or 'sum').reset_index()
+		df['startDate'] = date_ranges[0]['startDate']
+		df['endDate'] = date_ranges[0]['endDate']
+
+		return df.sort_values(dimension_names[0])
+
+	def _check_additive(self, metric_names: list, metric_types: dict ={}) -> None:
+		"""
+		Raises ValueError if any of the metrics cannot be summed across date ranges, judging by
+		`non_additive_metrics`, by names of averages, ratios and rates, and by the PERCENT and FLOAT types
+		of `metricHeaderEntries`.
+		"""
+		non_additive = [metric for metric in metric_names
+						if metric in self.non_additive_metrics
+						or re.search(r'^ga:(avg|percent)|Per[A-Z]|Rate$', metric)
+						or metric_types.get(metric) in ('PERCENT', 'FLOAT')]
+		if non_additive:
+			raise ValueError(f"{', '.join(non_additive)} cannot be summed across shards. "
+							"Include ga:date in the dimensions, or pass `aggfunc`, e.g. {'ga:users': 'max'}.")
+
+	def _get_unsampled(self, report_request: dict, start_date, end_date, api=None) -> list:
+		"""
+		Gets every page of `report_request` between start_date and end_date.
+		Bisects the date range while the response is sampled. Returns a list of DataFrames.
+		"""
+		api = api or self.api
+		report_request = dict(report_request, pageToken='0', dateRanges=[{
+			'startDate': start_date.strftime('%Y-%m-%d'),
+			'endDate': end_date.strftime('%Y-%m-%d'),
+		}])
+
+		res = self._execute({'reportRequests': [report_request]}, api=api, num_retries=5)
+		report = res['reports'][0]
+		if report['data'].get('samplesReadCounts'):
+			if start_date < end_date:
+				middle = start_date + (end_date - start_date) // 2
+				return self._get_unsampled(report_request, start_date, middle, api=api) \
+					+ self._get_unsampled(report_request, middle + datetime.timedelta(days=1), end_date, api=api)
+			print(f"Sampled data for {start_date}, which cannot be split further.")
+
+		dfs = [self._report_to_df(report, report_request, sort=False)] if report['data'].get('rows') else []
+		if report.get('nextPageToken'):
+			dfs += self._batch_get([dict(report_request, pageToken=report['nextPageToken'])], api=api)
+		return dfs
+
+	@staticmethod
+	def _resolve_date(date: str, today=None) -> datetime.date:
+		"Resolves 'today', 'yesterday', 'NdaysAgo' or 'YYYY-MM-DD' into a date."
+		today = today or datetime.date.today()
+		if date == 'today':
+			return today
+		if date == 'yesterday':
+			return today - datetime.timedelta(days=1)
+		if date.endswith('daysAgo'):
+			return today - datetime.timedelta(days=int(date[:-len('daysAgo')]))
+		return datetime.datetime.strptime(date, '%Y-%m-%d').date()
 
 	def reset(self):
-		self.res = []
+		self.res = deque(maxlen=self.history_size)
 		self.req = ""
 
-	def to_df(self, res=None):
+	def to_df(self, res=None, sort: bool =True):
 		"""
 		Converts a JSON res object into a Pandas DataFrame.
 		Input:
 			- res: optional JSON Google Analytics API v4 response object. If not supplied, self.res is used instead.
+			- sort: whether to sort the rows by the first dimension.
 		Output:
 			- df: a Pandas DataFrame version of the response object.
 		"""
 
 		if res is None: res = self.res[-1]
 
-		dimensions = res['reports'][0]['columnHeader']['dimensions']
-		columns = [header['name'] for header in res['reports'][0]['columnHeader']['metricHeader']['metricHeaderEntries']]
-		data = res['reports'][0]['data']['rows']
-		df = pd.DataFrame(data)
+		# Store DataFrame for convenience.
+		self.df = self._report_to_df(res['reports'][0], self.req['reportRequests'][0], sort=sort)
+
+		return self.df
 
-		# Split dimensions as separate columns. If dimensions is a single value, then save a single column.
-		keys = np.array(df['dimensions'].tolist())
+	def _report_to_df(self, report: dict, report_request: dict, sort: bool =True) -> pd.DataFrame:
+		"""
+		Converts a single report of a response into a DataFrame. `report_request` is the request it answers.
+
+		Each column is decoded straight from the rows into a typed array: INTEGER metrics as int64,
+		other metrics as float64 and ga:date as datetime64. When the request has several date ranges,
+		metric and date columns get a suffix per date range, e.g. ga:sessions_1 and ga:sessions_2.
+		"""
+		dimensions = report['columnHeader']['dimensions']
+		headers = report['columnHeader']['metricHeader']['metricHeaderEntries']
+		rows = report['data'].get('rows', [])
+		n_rows = len(rows)
+		date_ranges = report_request['dateRanges']
+
+		columns = {}
+		keys = list(map(itemgetter('dimensions'), rows))
 		for ix, dim in enumerate(dimensions):
-			df[dim] = keys[:, ix]
-		df.drop('dimensions', axis=1, inplace=True)
+			values = list(map(itemgetter(ix), keys))
+			if dim == 'ga:date':
+				columns[dim] = pd.to_datetime(values, format='%Y%m%d')
+			else:
+				columns[dim] = np.array(values, dtype=object)
 
-		# Split metrics as separate columns. If metrics is a single value per row, then save that value.
-		df['metrics'] = df.metrics.apply(lambda x: x[0]['values'])
-		values = np.array(df['metrics'].tolist())
-		for ix, col in enumerate(columns):
-			df[col] = values[:, ix].astype(float)
-		df.drop('metrics', axis=1, inplace=True)
+		for range_ix in range(len(date_ranges)):
+			suffix = f'_{range_ix + 1}' if len(date_ranges) > 1 else ''
+			values = [row['metrics'][range_ix]['values'] for row in rows]
+			for ix, header in enumerate(headers):
+				parse, dtype = (int, np.int64) if header['type'] == 'INTEGER' else (float, np.float64)
+				columns[header['name'] + suffix] = np.fromiter(map(parse, map(itemgetter(ix), values)), dtype, n_rows)
 
 		# Add date columns.
-		date_ranges = self.req['reportRequests'][0]['dateRanges'][0]
-		df['startDate'] = date_ranges['startDate']
-		df['endDate'] = date_ranges['endDate']
+		for range_ix, date_range in enumerate(date_ranges):
+			suffix = f'_{range_ix + 1}' if len(date_ranges) > 1 else ''
+			columns['startDate' + suffix] = np.full(n_rows, date_range['startDate'], dtype=object)
+			columns['endDate' + suffix] = np.full(n_rows, date_range['endDate'], dtype=object)
 
-		# Sort values by the first dimensions column
-		df.sort_values(dimensions[0], inplace=True)
+		df = pd.DataFrame(columns)
+		df.attrs['metric_types'] = {header['name']: header['type'] for header in headers}
 
-		# Store DataFrame for convenience.
-		self.df = df
+		# Sort values by the first dimensions column
+		if sort:
+			df.sort_values(dimensions[0], inplace=True)
 
-		return self.df
+		return df
 
 	@property
 	def google_organic(self):
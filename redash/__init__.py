@@ -1 +1,23 @@
+from typing import TYPE_CHECKING
+
+try:
+    from .._lazy import lazy_attributes
+except ImportError:
+    # Imported as a top-level package, with the repository root on sys.path.
+    from _lazy import lazy_attributes
+
 from .src.redash import Redash
+from .src.cache import RedashCache
+from .src.sync import RedashSync
+
+# `AsyncRedash` needs aiohttp, so only import it when it is used.
+_lazy_attributes = {
+    'AsyncRedash': '.src.async_redash',
+}
+
+__all__ = ['Redash', 'RedashCache', 'RedashSync'] + list(_lazy_attributes)
+
+if TYPE_CHECKING:
+    from .src.async_redash import AsyncRedash
+
+__getattr__, __dir__ = lazy_attributes(globals(), _lazy_attributes)
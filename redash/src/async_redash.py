@@ -0,0 +1,201 @@
+import asyncio
+import json
+import warnings
+from typing import AsyncIterator, Iterable, Optional, Tuple
+
+import aiohttp
+import pandas as pd
+
+from .redash import PENDING, STARTED, SUCCESS, FAILURE, CANCELLED, result_to_df
+
+
+class AsyncRedash:
+    """
+    An asyncio client for running many Redash queries at once.
+
+    Every query is submitted as soon as a slot is free, up to `max_concurrency` queries at a
+    time so that the Redash queue is not flooded. The jobs of all outstanding queries are
+    checked together by a single polling loop, and results are returned as they complete.
+
+    Usage:
+        async def main():
+            async with AsyncRedash(credentials, max_concurrency=8) as redash:
+                queries = [(2880, {'station1': '池袋', 'station2': station}) for station in stations]
+                async for (query_id, params), df in redash.as_completed(queries):
+                    df.to_csv(f"{params['station2']}.csv")
+
+        asyncio.run(main())
+    """
+
+    def __init__(self,
+                 credentials: str,
+                 max_concurrency: int = 10,
+                 poll_interval: float = 0.1,
+                 max_poll_interval: float = 5.0,
+                 timeout: Optional[float] = 30 * 60) -> None:
+        """
+        Input:
+            - credentials: the path to the credentials JSON file. See `Redash`.
+            - max_concurrency: the maximum number of queries submitted to Redash at the same time.
+            - poll_interval: seconds to wait before the first check of new query jobs.
+            The wait doubles after every check, up to `max_poll_interval`.
+            - timeout: seconds to wait for a query job before raising TimeoutError. None waits forever.
+        """
+        secrets = json.load(open(credentials))
+        self.endpoint = secrets['endpoint']
+        self.apikey = secrets['apikey']
+        self.max_concurrency = max_concurrency
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.timeout = timeout
+
+        # Created lazily, because they belong to the event loop that is running when first used.
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._poller: Optional[asyncio.Task] = None
+
+        # Outstanding jobs: job id -> (future resolved with the final job, deadline).
+        self._jobs: dict = {}
+        self._has_new_jobs = False
+
+    async def __aenter__(self) -> 'AsyncRedash':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        "Stops polling and closes the connections."
+        if self._poller is not None:
+            self._poller.cancel()
+            try:
+                await self._poller
+            except asyncio.CancelledError:
+                pass
+            self._poller = None
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def query(self, query_id: int, params: dict = {}, max_age: int = 0) -> pd.DataFrame:
+        "Queries Redash at `query_id`. See `Redash.query`."
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async with self._semaphore:
+            post_data = {
+                'parameters': {str(key): str(value) for key, value in params.items()},
+                'max_age': max_age,  # how long to use cached data
+            }
+            query_params = {f'p_{key}': str(value) for key, value in params.items()}
+            result = await self._request('POST', f'/api/queries/{query_id}/results',
+                                         params=query_params, json=post_data)
+
+            # Results that were already cached by Redash come back without a job.
+            if 'job' in result:
+                job = await self._wait_for_job(result['job'])
+                if job['status'] == SUCCESS:
+                    result = await self._request('GET', f'/api/query_results/{job["query_result_id"]}')
+                elif job['status'] == CANCELLED:
+                    raise Exception(f"Query job {job['id']} was cancelled.")
+                else:
+                    raise Exception(f"{job.get('error')}")
+
+        if 'query_result' not in result:
+            warnings.warn(f"`query_result` not found in `result`. {result.items()}")
+            return pd.DataFrame()
+        return result_to_df(result['query_result'])
+
+    async def as_completed(self, queries: Iterable[Tuple[int, dict]], max_age: int = 0,
+                           return_exceptions: bool = False) -> AsyncIterator[Tuple[Tuple[int, dict], pd.DataFrame]]:
+        """
+        Runs every (query_id, params) pair in `queries` and yields ((query_id, params), df) as each finishes.
+        Input:
+            - queries: an iterable of (query_id, params) pairs.
+            - max_age: see `Redash.query`.
+            - return_exceptions: yield the exception of a failed query in place of its DataFrame,
+            instead of raising it and cancelling the other queries.
+        """
+        tasks = {asyncio.ensure_future(self.query(query_id, params=params, max_age=max_age)): (query_id, params)
+                 for query_id, params in queries}
+        try:
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None and not return_exceptions:
+                        raise task.exception()
+                    yield tasks[task], task.exception() or task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def query_many(self, queries: Iterable[Tuple[int, dict]], max_age: int = 0,
+                         return_exceptions: bool = False) -> list:
+        "Runs every (query_id, params) pair in `queries` and returns their DataFrames in the same order."
+        return await asyncio.gather(*(self.query(query_id, params=params, max_age=max_age)
+                                      for query_id, params in queries),
+                                    return_exceptions=return_exceptions)
+
+    async def _request(self, method: str, path: str, params: dict = {}, json: Optional[dict] = None) -> dict:
+        if self._session is None:
+            self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.max_concurrency))
+        async with self._session.request(method, f'{self.endpoint}{path}',
+                                         params=dict(params, api_key=self.apikey), json=json) as response:
+            response.raise_for_status()
+            return await response.json(content_type=None)
+
+    async def _wait_for_job(self, job: dict) -> dict:
+        "Waits until the polling loop sees the job succeed, fail or get cancelled, and returns its final state."
+        if job['status'] not in (PENDING, STARTED):
+            return job
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        deadline = None if self.timeout is None else loop.time() + self.timeout
+        self._jobs[job['id']] = (future, deadline)
+        self._has_new_jobs = True
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.ensure_future(self._poll_jobs())
+        return await future
+
+    async def _poll_jobs(self) -> None:
+        """
+        Checks every outstanding job, then sleeps, until there are none left.
+        The sleep starts at `poll_interval` whenever new jobs come in and doubles up to `max_poll_interval`.
+        """
+        loop = asyncio.get_running_loop()
+        interval = self.poll_interval
+        try:
+            while self._jobs:
+                if self._has_new_jobs:
+                    interval, self._has_new_jobs = self.poll_interval, False
+                await asyncio.sleep(interval)
+                interval = min(interval * 2, self.max_poll_interval)
+
+                job_ids = list(self._jobs)
+                states = await asyncio.gather(*(self._request('GET', f'/api/jobs/{job_id}') for job_id in job_ids),
+                                              return_exceptions=True)
+                now = loop.time()
+                for job_id, state in zip(job_ids, states):
+                    future, deadline = self._jobs[job_id]
+                    if future.done():
+                        # The caller stopped waiting, e.g. because it was cancelled.
+                        del self._jobs[job_id]
+                    elif isinstance(state, Exception):
+                        del self._jobs[job_id]
+                        future.set_exception(state)
+                    elif state['job']['status'] in (SUCCESS, FAILURE, CANCELLED):
+                        del self._jobs[job_id]
+                        future.set_result(state['job'])
+                    elif deadline is not None and now > deadline:
+                        del self._jobs[job_id]
+                        future.set_exception(TimeoutError(
+                            f"Query job {job_id} did not finish within {self.timeout} seconds."))
+        except BaseException as e:
+            # Never leave a caller waiting on a job that nobody polls anymore.
+            for future, _ in self._jobs.values():
+                if not future.done():
+                    future.set_exception(e if isinstance(e, Exception) else asyncio.CancelledError())
+            self._jobs.clear()
+            raise
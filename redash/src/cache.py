@@ -0,0 +1,69 @@
+import time
+import warnings
+from typing import Optional
+
+import pandas as pd
+
+try:
+    from ..._disk_cache import DiskCache
+except ImportError:
+    # `src` was imported on its own, as in the tests, with the repository root on sys.path.
+    from _disk_cache import DiskCache
+
+
+class RedashCache(DiskCache):
+    """
+    An on-disk cache for Redash query results.
+
+    Entries are keyed on the Redash endpoint, the query id and the normalized parameters,
+    and the results are stored as Parquet files in `directory` next to the id and
+    `retrieved_at` time of the Redash query result they came from. `Redash.query` skips Redash
+    entirely when the cached result was retrieved less than `max_age` seconds ago.
+    When the cache grows over `max_bytes`, the least recently used entries are evicted.
+
+    Usage:
+        cache = RedashCache('./cache/redash', max_bytes=2 * 2**30)
+        redash = Redash(credentials, cache=cache)
+        df = redash.query(1605, max_age=60 * 60)
+        cache.stats()
+    """
+
+    def key(self, endpoint: str, query_id: int, params: dict, **options) -> str:
+        """Returns the cache key for `query_id` with `params` on `endpoint`.
+        Parameters are compared as strings, as they are sent to Redash. Any `options` that
+        change the resulting DataFrame, e.g. result_format, are part of the key."""
+        return self._hash({
+            'endpoint': endpoint.rstrip('/'),
+            'query_id': int(query_id),
+            'params': {str(key): str(value) for key, value in params.items()},
+            'options': options,
+        })
+
+    def get(self, key: str, max_age: float) -> Optional[pd.DataFrame]:
+        """
+        Returns the cached DataFrame for `key` if it was retrieved by Redash less than
+        `max_age` seconds ago, and otherwise None.
+        """
+        data_path, meta_path = self._paths(key)
+        meta = self._load_json(meta_path)
+        try:
+            df = pd.read_parquet(data_path) \
+                if meta is not None and time.time() - meta['retrieved_at'] <= max_age else None
+        except FileNotFoundError:
+            df = None
+        if df is None:
+            self._count(hit=False)
+            return None
+
+        self._touch(key)
+        self._count(hit=True)
+        return df
+
+    def put(self, key: str, df: pd.DataFrame, query_result_id: Optional[int], retrieved_at: float) -> None:
+        "Stores `df` under `key` with the Redash query result it came from, then evicts entries over `max_bytes`."
+        meta = {'query_result_id': query_result_id, 'retrieved_at': retrieved_at, 'rows': len(df)}
+        try:
+            self._write(key, lambda path: df.to_parquet(path, index=False), meta)
+        except Exception as e:
+            # e.g. a column that mixes numbers and strings cannot be stored as Parquet.
+            warnings.warn(f"Could not cache the result: {e}")
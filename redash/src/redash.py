@@ -1,18 +1,92 @@
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+import numpy as np
 import pandas as pd
 import json
 import time
 import requests
 from requests import Response
+from requests.adapters import HTTPAdapter
 import warnings
 
+from .cache import RedashCache
+
+# Statuses of a Redash query job.
+PENDING, STARTED, SUCCESS, FAILURE, CANCELLED = 1, 2, 3, 4, 5
+
+
+def result_to_df(query_result: dict, typed: bool = True,
+                 categorical_threshold: float = 0.0) -> pd.DataFrame:
+    """
+    Converts the `query_result` of a Redash API response into a DataFrame.
+    Input:
+        - query_result: the `query_result` of a Redash API response.
+        - typed: build each column with the dtype of its Redash `type`: integer as int64,
+        float as float64, boolean as bool, date and datetime as datetime64. Integer and
+        boolean columns with nulls use the nullable Int64 and boolean dtypes. If False,
+        every column is left as Python objects.
+        - categorical_threshold: string columns with at most this many unique values per row
+        become categoricals, e.g. 0.01 for columns such as a prefecture or a status. Categoricals
+        save memory on repeated values, but turn comparisons and string operations on the column
+        into categorical ones, so they are opt-in. The default, 0, keeps every string column as is.
+    """
+    data = query_result['data']
+    rows = data['rows']
+    names = [column['name'] for column in data['columns']]
+    if not typed:
+        return pd.DataFrame(rows, columns=names)
+
+    columns = {}
+    for column in data['columns']:
+        values = [row.get(column['name']) for row in rows]
+        try:
+            columns[column['name']] = _decode_column(values, column.get('type'), categorical_threshold)
+        except (ValueError, TypeError, OverflowError):
+            # The declared type does not fit the values, e.g. a string in an integer column.
+            columns[column['name']] = pd.array(values, dtype=object)
+    return pd.DataFrame(columns, columns=names)
+
+
+def _parse_timestamp(value: Optional[str]) -> float:
+    "Returns a Redash timestamp such as '2020-03-31T01:23:45.678+00:00' as seconds since the epoch, or now if missing."
+    if not value:
+        return time.time()
+    return pd.Timestamp(value).timestamp()
+
+
+def _decode_column(values: list, redash_type: Optional[str], categorical_threshold: float):
+    "Returns `values` as an array of the dtype that corresponds to `redash_type`."
+    has_nulls = None in values
+    if redash_type == 'integer':
+        return pd.array(values, dtype='Int64') if has_nulls else np.array(values, dtype=np.int64)
+    if redash_type == 'float':
+        return np.array(values, dtype=np.float64)
+    if redash_type == 'boolean':
+        return pd.array(values, dtype='boolean') if has_nulls else np.array(values, dtype=bool)
+    if redash_type in ('date', 'datetime'):
+        try:
+            return pd.to_datetime(values, format='ISO8601')
+        except ValueError:
+            # Mixed UTC offsets can only be represented in UTC.
+            return pd.to_datetime(values, format='ISO8601', utc=True)
+    if redash_type == 'string' and values and categorical_threshold > 0:
+        codes, uniques = pd.factorize(np.array(values, dtype=object))
+        if len(uniques) <= categorical_threshold * len(values):
+            return pd.Categorical.from_codes(codes, categories=uniques)
+    return pd.array(values, dtype=object)
+
 
 class Redash:
     "A wrapper class for easy querying of data from Redash."
 
     def __init__(self,
                  credentials: str,
-                 data_source_id: int = 4) -> None:
+                 data_source_id: int = 4,
+                 poll_interval: float = 0.1,
+                 max_poll_interval: float = 5.0,
+                 timeout: Optional[float] = 30 * 60,
+                 pool_size: int = 10,
+                 cache: Optional[RedashCache] = None) -> None:
         """
         Input:
             - credentials: the path to the credentials JSON file. The
@@ -27,16 +101,51 @@ class Redash:
 
             - data_source_id: the id of the data source. For the Instabase
             application database, use the default, 4.
+            - poll_interval: seconds to wait before the first check of a query job.
+            The wait doubles after every check, up to `max_poll_interval`.
+            - timeout: seconds to wait for a query job before raising TimeoutError. None waits forever.
+            - pool_size: the number of connections to Redash kept open for reuse.
+            - cache: optional RedashCache to keep results locally. See `query`.
         """
         secrets = json.load(open(credentials))
         self.endpoint = secrets['endpoint']
         self.apikey = secrets['apikey']
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.timeout = timeout
+        self.cache = cache
         self.req: Optional[str] = None
         self.res: Optional[Response] = None
 
+        # Reuse connections across requests instead of a new TCP and TLS handshake every time.
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        # Seconds spent queued, executing and downloading, per query. See `query`.
+        self.timings: list = []
+
     def query(self, query_id: int, params: dict = {},
-              max_age: int = 0, bind: dict = {}) -> pd.DataFrame:
-        "Queries Redash at `query_id`"
+              max_age: int = 0, bind: dict = {},
+              result_format: str = 'json', typed: bool = True,
+              categorical_threshold: float = 0.0) -> pd.DataFrame:
+        """
+        Queries Redash at `query_id`
+        Input:
+            - query_id: Query ID.
+            - params: Any parameters as a dictionary.
+            - max_age: how long, in seconds, Redash may serve a cached result for. 0 always runs the query.
+            - result_format: 'json' decodes the typed JSON result. 'csv' downloads the result as CSV and
+            parses it while it streams in, which needs much less memory for results of millions of rows.
+            Column types are then inferred by `pd.read_csv`, so dates stay strings.
+            - typed, categorical_threshold: see `result_to_df`. Only used with 'json'.
+            - bind: DEPRECATED. Parameters dictionary.
+
+        With a `cache`, a result that Redash retrieved less than `max_age` seconds ago is returned
+        from the cache without calling Redash at all. Every result fetched from Redash is cached.
+        """
+        assert result_format in ('json', 'csv'), "Invalid result format. Choose from 'json' or 'csv'."
         # Move `bind` to `params` if `bind is still used.`
         if bind:
             params = bind
@@ -44,7 +153,7 @@ class Redash:
                 "Parameter `bind` is deprecated. Use `params` instead.", DeprecationWarning)
 
         # Obtain request URI
-        self.req = self._build_query_uri(query_id, params)
+        req = self._build_query_uri(query_id, params)
 
         # Convert all post data to strings
         post_data = {
@@ -55,49 +164,127 @@ class Redash:
             'max_age': max_age  # how long to use cached data
         }
 
-        self.res = requests.post(
-            self.req, headers={'content-type': 'application/json'}, json=post_data)
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.key(self.endpoint, query_id, params, result_format=result_format, typed=typed,
+                                       categorical_threshold=categorical_threshold)
+            if max_age > 0:
+                df = self.cache.get(cache_key, max_age=max_age)
+                if df is not None:
+                    print(f"Loaded {len(df)} rows for query_id = {query_id} from the cache.")
+                    return df
+
+        timing = {'query_id': query_id, 'queue': 0.0, 'execution': 0.0, 'download': 0.0}
+        started_at = time.perf_counter()
+        # Responses are kept in local variables, since `query` may run on several threads at once,
+        # e.g. in `safe_query`. `self.req` and `self.res` only record the last ones for inspection.
+        res = self.session.post(
+            req, headers={'content-type': 'application/json'}, json=post_data)
 
         # Wait for the query job to finish.
         # Skip and do nothing if the response does not contain 'job'
         # This happens when the query had already been cached.
-        result = self.res.json()
+        result = res.json()
+        df = None
 
         if 'job' in result.keys():
-            job = result['job']
-            while job['status'] not in (3, 4):
-                self.res = requests.get(
-                    f'{self.endpoint}/api/jobs/{job["id"]}?api_key={self.apikey}')
-                job = self.res.json()['job']
-                time.sleep(1)
-
-            if 'query_result_id' in job.keys():
-                query_result_id = job['query_result_id']
-                self.res = requests.get(
-                    f'{self.endpoint}/api/query_results/{query_result_id}?api_key={self.apikey}')
-            elif 'error' in job.keys():
-                raise Exception(f"{job['error']}")
-
-        result = self.res.json()
-
-        if not 'query_result' in result.keys():
-            warnings.warn(
-                f"`query_result` not found in `result`. {result.items()}")
-            return pd.DataFrame()
+            job = self._wait_for_job(result['job'], timing)
+
+            if job['status'] == SUCCESS:
+                download_started_at = time.perf_counter()
+                if result_format == 'csv':
+                    df = self._download_csv(job['query_result_id'])
+                    query_result_id, retrieved_at = job['query_result_id'], time.time()
+                else:
+                    res = self.session.get(
+                        f'{self.endpoint}/api/query_results/{job["query_result_id"]}?api_key={self.apikey}')
+                    result = res.json()
+                timing['download'] = time.perf_counter() - download_started_at
+            elif job['status'] == CANCELLED:
+                raise Exception(f"Query job {job['id']} was cancelled.")
+            else:
+                raise Exception(f"{job.get('error')}")
+        else:
+            # Results that were already cached by Redash come back with the POST.
+            timing['download'] = time.perf_counter() - started_at
+
+        timing['total'] = time.perf_counter() - started_at
+        self.timings.append(timing)
+        self.req, self.res = req, res
 
-        # Convert response to a Pandas DataFrame
-        data = result['query_result']['data']
-        columns = [column['name'] for column in data['columns']]
+        if df is None:
+            if not 'query_result' in result.keys():
+                warnings.warn(
+                    f"`query_result` not found in `result`. {result.items()}")
+                return pd.DataFrame()
+
+            # Convert response to a Pandas DataFrame
+            df = result_to_df(result['query_result'], typed=typed, categorical_threshold=categorical_threshold)
+            query_result_id = result['query_result'].get('id')
+            retrieved_at = _parse_timestamp(result['query_result'].get('retrieved_at'))
+
+        if cache_key is not None:
+            self.cache.put(cache_key, df, query_result_id, retrieved_at)
         print(
-            f"Successuflly fetched {len(data['rows'])} rows from query_id = {query_id}."
+            f"Successuflly fetched {len(df)} rows from query_id = {query_id}."
         )
-        df = pd.DataFrame(data['rows'], columns=columns)
 
         return df
 
+    def _download_csv(self, query_result_id: int) -> pd.DataFrame:
+        "Parses the CSV export of a query result while it is being downloaded."
+        res = self.session.get(
+            f'{self.endpoint}/api/query_results/{query_result_id}.csv?api_key={self.apikey}', stream=True)
+        res.raise_for_status()
+        res.raw.decode_content = True
+        try:
+            return pd.read_csv(res.raw)
+        except pd.errors.EmptyDataError:
+            return pd.DataFrame()
+        finally:
+            res.close()
+
+    def _wait_for_job(self, job: dict, timing: dict) -> dict:
+        """
+        Polls a query job until it succeeds, fails or is cancelled, and returns its final state.
+        Checks are frequent at first, since most queries finish within a second, then back off
+        exponentially up to `max_poll_interval`. Raises TimeoutError after `timeout` seconds.
+        Records the time spent queued and executing in `timing`.
+        """
+        submitted_at = time.perf_counter()
+        deadline = None if self.timeout is None else submitted_at + self.timeout
+        started_at = submitted_at if job['status'] != PENDING else None
+
+        interval = self.poll_interval
+        while job['status'] not in (SUCCESS, FAILURE, CANCELLED):
+            wait = interval
+            if deadline is not None:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    raise TimeoutError(
+                        f"Query job {job['id']} did not finish within {self.timeout} seconds.")
+                wait = min(wait, remaining)
+            time.sleep(wait)
+            interval = min(interval * 2, self.max_poll_interval)
+
+            res = self.session.get(
+                f'{self.endpoint}/api/jobs/{job["id"]}?api_key={self.apikey}')
+            job = res.json()['job']
+            if started_at is None and job['status'] != PENDING:
+                started_at = time.perf_counter()
+
+        finished_at = time.perf_counter()
+        started_at = started_at or finished_at
+        timing['queue'] = started_at - submitted_at
+        timing['execution'] = finished_at - started_at
+        return job
+
     def safe_query(self, query_id: int, params: dict = {},
                    max_age: int = 0, bind: dict = {},
-                   limit: int = 10000, max_iter: int = 100) -> pd.DataFrame:
+                   limit: int = 10000, max_iter: int = 100,
+                   max_workers: int = 1,
+                   sink: Optional[Callable[[pd.DataFrame], None]] = None,
+                   result_format: str = 'json') -> Optional[pd.DataFrame]:
         """
         Queries Redash certain rows at a time. The query must have implemented the parameters `offset_rows` and `limit_rows` to work.
         Input:
@@ -106,33 +293,96 @@ class Redash:
             - params: Any parameters as a dictionary.
             - limit: Number of rows to fetch at a time.
             - max_iter: Max iterations. A safe guard to avoid an infinte loop.
+            - max_workers: Number of pages to query at the same time. Keep it small so that
+            the Redash queue is not flooded. Pages after the first short page are discarded.
+            - sink: Optional callable that receives each page as a DataFrame, in order,
+            instead of keeping all the pages in memory.
+            - result_format: 'json' or 'csv'. See `query`.
             - bind: DEPRECATED. Parameters dictionary.
         Output:
-            - dataframe: A dataframe of the fetched data.
+            - dataframe: A dataframe of the fetched data, or None if `sink` is given.
         """
         if bind:
             params = bind
             warnings.warn(
                 "Parameter `bind` is deprecated. Use `params` instead.", DeprecationWarning)
 
-        final_df = pd.DataFrame()
-        batch_ix = 0
-        while True:
-            start_ix = batch_ix * limit
-            params.update({'offset_rows': start_ix, 'limit_rows': limit})
-            partial_df = self.query(query_id, params=params, max_age=max_age)
-            final_df = pd.concat([final_df, partial_df], axis=0)
-            batch_ix += 1
+        def fetch_page(batch_ix):
+            page_params = dict(params, offset_rows=batch_ix * limit, limit_rows=limit)
+            return self.query(query_id, params=page_params, max_age=max_age, result_format=result_format)
 
-            # If the number of rows fetched is less than the `limit` it means we got all the data.
-            if len(partial_df) < limit:
-                break
+        pages = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {}
+            next_ix = 0
+            for batch_ix in range(max_iter):
+                # Keep up to `max_workers` pages in flight, ahead of the page being consumed.
+                while next_ix < min(batch_ix + max_workers, max_iter):
+                    futures[next_ix] = executor.submit(fetch_page, next_ix)
+                    next_ix += 1
+
+                try:
+                    partial_df = futures.pop(batch_ix).result()
+                except Exception:
+                    for future in futures.values():
+                        future.cancel()
+                    raise
 
-            # Stop if the number of iterations goes above the max_iter limit.
-            if batch_ix >= max_iter:
-                break
+                if sink is not None:
+                    sink(partial_df)
+                else:
+                    pages.append(partial_df)
 
-        return final_df
+                # If the number of rows fetched is less than the `limit` it means we got all the data.
+                if len(partial_df) < limit:
+                    break
+
+            # Pages past the end of the data that have not started yet are not needed.
+            for future in futures.values():
+                future.cancel()
+
+        if sink is not None:
+            return None
+        if not pages:
+            return pd.DataFrame()
+        return pd.concat(pages, axis=0)
+
+    def iter_keyset(self, query_id: int, key: str, key_param: str = 'last_id', start=0,
+                    params: dict = {}, max_age: int = 0, limit: int = 10000,
+                    limit_param: str = 'limit_rows', max_iter: int = 100_000):
+        """
+        Queries Redash a page at a time by a monotonically increasing key, and yields each page as a DataFrame.
+        Unlike `safe_query`, the database never rescans the rows of previous pages, so later pages are as fast as the first.
+        The query must filter and sort by the key with the parameters `key_param` and `limit_param`, e.g.:
+
+            SELECT * FROM reservations WHERE id > {{ last_id }} ORDER BY id LIMIT {{ limit_rows }}
+
+        Input:
+            - query_id: Query ID.
+            - key: the column to page by. Its values must be unique, or rows that share the
+            last value of a page are skipped.
+            - key_param: the parameter that receives the last key of the previous page.
+            - start: the value of `key_param` for the first page, e.g. 0 or '1970-01-01'.
+            - params: Any other parameters as a dictionary.
+            - limit: Number of rows to fetch at a time, passed as `limit_param`.
+            - max_iter: Max iterations. A safe guard to avoid an infinte loop.
+
+        Usage:
+            for df in redash.iter_keyset(3011, key='id', start=0, limit=100_000):
+                df.to_parquet(f"reservations-{df['id'].max()}.parquet")
+        """
+        last_key = start
+        for _ in range(max_iter):
+            page_params = dict(params, **{key_param: last_key, limit_param: limit})
+            partial_df = self.query(query_id, params=page_params, max_age=max_age)
+            if len(partial_df) == 0:
+                return
+            yield partial_df
+
+            # If the number of rows fetched is less than the `limit` it means we got all the data.
+            if len(partial_df) < limit:
+                return
+            last_key = partial_df[key].max()
 
     def _build_query_uri(self, query_id: int, params: dict = {}) -> str:
         "Builds query request URI."
@@ -0,0 +1,130 @@
+import datetime
+import hashlib
+import json
+import os
+from typing import Optional
+
+import pandas as pd
+
+from .redash import Redash
+
+
+class RedashSync:
+    """
+    Keeps a local copy of a large Redash query up to date, by fetching only the rows added since the last run.
+
+    Rows are fetched with `Redash.iter_keyset`, by a monotonically increasing key such as an
+    id or a creation time. The largest key fetched so far, the high-water mark, is saved after
+    every page, so each run, even after an interruption, starts right after the last stored row.
+    Every page is appended to the store as a new Parquet part file.
+
+    Layout:
+        <root>/<query_id>[-<params hash>]/part-000001.parquet
+        <root>/<query_id>[-<params hash>]/_state.json
+
+    Usage:
+        redash = Redash(credentials)
+        sync = RedashSync(redash, './data/redash', 3011, key='id')
+        sync.sync()
+        df = sync.read()
+    """
+
+    def __init__(self, redash: Redash, root: str, query_id: int, key: str,
+                 key_param: str = 'last_id', start=0, params: dict = {},
+                 limit: int = 100_000, limit_param: str = 'limit_rows') -> None:
+        """
+        Input:
+            - redash: the Redash to fetch data with.
+            - root: the directory of the local store.
+            - query_id: Query ID. See `Redash.iter_keyset` for how the query must use the parameters.
+            - key: the column to page by.
+            - key_param: the parameter that receives the high-water mark.
+            - start: the value of `key_param` on the very first run, e.g. 0 or '1970-01-01'.
+            - params: Any other parameters. Each set of parameters is stored separately.
+            - limit: Number of rows to fetch at a time, passed as `limit_param`.
+        """
+        self.redash = redash
+        self.query_id = query_id
+        self.key = key
+        self.key_param = key_param
+        self.start = start
+        self.params = dict(params)
+        self.limit = limit
+        self.limit_param = limit_param
+
+        dataset = str(query_id)
+        if self.params:
+            normalized = json.dumps({str(k): str(v) for k, v in self.params.items()}, sort_keys=True)
+            dataset += f"-{hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:8]}"
+        self.directory = os.path.join(root, dataset)
+        self.state_path = os.path.join(self.directory, '_state.json')
+        os.makedirs(self.directory, exist_ok=True)
+
+    @property
+    def state(self) -> dict:
+        "Returns {'high_water_mark': key, 'parts': int, 'rows': int, 'synced_at': str} of the store."
+        if not os.path.exists(self.state_path):
+            return {'high_water_mark': self.start, 'parts': 0, 'rows': 0, 'synced_at': None}
+        with open(self.state_path) as f:
+            return json.load(f)
+
+    @property
+    def high_water_mark(self):
+        "The largest key stored so far, or `start` if nothing is stored yet."
+        return self.state['high_water_mark']
+
+    def sync(self, max_iter: int = 100_000) -> int:
+        """Fetches the rows beyond the high-water mark and appends them to the store.
+        Output:
+            - The number of rows fetched.
+        """
+        state = self.state
+        print(f"Fetching rows of query_id = {self.query_id} with {self.key} > {state['high_water_mark']}.")
+
+        n_rows = 0
+        pages = self.redash.iter_keyset(self.query_id, key=self.key, key_param=self.key_param,
+                                        start=state['high_water_mark'], params=self.params,
+                                        limit=self.limit, limit_param=self.limit_param, max_iter=max_iter)
+        for df in pages:
+            state['parts'] += 1
+            self._write_part(df, state['parts'])
+
+            state['high_water_mark'] = _to_json_value(df[self.key].max())
+            state['rows'] += len(df)
+            state['synced_at'] = datetime.datetime.now().isoformat(timespec='seconds')
+
+            # Save after every page so that an interrupted run does not refetch stored rows.
+            self._save_state(state)
+            n_rows += len(df)
+
+        print(f"Synced {n_rows} rows. {self.key} is now up to {state['high_water_mark']}.")
+        return n_rows
+
+    def read(self, columns: Optional[list] = None) -> pd.DataFrame:
+        "Returns every stored row as a single DataFrame."
+        parts = sorted(name for name in os.listdir(self.directory)
+                       if name.startswith('part-') and name.endswith('.parquet'))
+        frames = [pd.read_parquet(os.path.join(self.directory, name), columns=columns) for name in parts]
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, axis=0, ignore_index=True)
+
+    def _write_part(self, df: pd.DataFrame, part: int) -> None:
+        path = os.path.join(self.directory, f'part-{part:06d}.parquet')
+        df.to_parquet(path + '.tmp', index=False)
+        os.replace(path + '.tmp', path)
+
+    def _save_state(self, state: dict) -> None:
+        with open(self.state_path + '.tmp', 'w') as f:
+            json.dump(state, f, indent=1, sort_keys=True)
+        os.replace(self.state_path + '.tmp', self.state_path)
+
+
+def _to_json_value(value):
+    "Converts a key value from a DataFrame into something JSON can store and Redash accepts as a parameter."
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if hasattr(value, 'item'):
+        # NumPy scalars, e.g. numpy.int64.
+        return value.item()
+    return value
@@ -0,0 +1,144 @@
+# Run from top of module
+import asyncio
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('aiohttp')
+sys.path.append('./')
+sys.path.append('../')  # for the modules shared by the wrappers, e.g. _disk_cache
+from src.async_redash import AsyncRedash
+
+
+class StubRedash:
+    """
+    A local server that mimics the Redash endpoints used by AsyncRedash.
+    Every query returns rows with its query id and parameters, after its job
+    has been queued and running for `job_seconds` in total.
+    """
+
+    def __init__(self, job_seconds=0.2, failing_query_id=None):
+        self.job_seconds = job_seconds
+        self.failing_query_id = failing_query_id
+        self.jobs = {}
+        self.results = {}
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    def running(self):
+        return sum(1 for job in self.jobs.values() if not job['downloaded'])
+
+    def handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def send(self, body):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                query_id = int(urlparse(self.path).path.split('/')[3])
+                with stub.lock:
+                    job_id = f'job-{len(stub.jobs) + 1}'
+                    stub.jobs[job_id] = {'query_id': query_id, 'parameters': payload['parameters'],
+                                         'submitted_at': time.time(), 'downloaded': False}
+                    stub.max_running = max(stub.max_running, stub.running())
+                self.send({'job': {'id': job_id, 'status': 1}})
+
+            def do_GET(self):
+                path = urlparse(self.path).path.split('/')
+                if path[2] == 'jobs':
+                    self.send({'job': stub.job_state(path[3])})
+                else:
+                    self.send(stub.query_result(path[3]))
+
+        return Handler
+
+    def job_state(self, job_id):
+        job = self.jobs[job_id]
+        elapsed = time.time() - job['submitted_at']
+        if elapsed < self.job_seconds / 2:
+            return {'id': job_id, 'status': 1}
+        if elapsed < self.job_seconds:
+            return {'id': job_id, 'status': 2}
+        if job['query_id'] == self.failing_query_id:
+            return {'id': job_id, 'status': 4, 'error': 'relation does not exist'}
+        return {'id': job_id, 'status': 3, 'query_result_id': job_id}
+
+    def query_result(self, job_id):
+        with self.lock:
+            job = self.jobs[job_id]
+            job['downloaded'] = True
+        return {'query_result': {'id': job_id, 'data': {
+            'columns': [{'name': 'query_id'}, {'name': 'station'}],
+            'rows': [{'query_id': job['query_id'], 'station': job['parameters'].get('station', '')}] * 3,
+        }}}
+
+
+@pytest.fixture
+def stub(tmp_path):
+    stub = StubRedash()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), stub.handler())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    stub.credentials = str(tmp_path / 'secrets.json')
+    with open(stub.credentials, 'w') as f:
+        json.dump({'endpoint': f'http://127.0.0.1:{server.server_port}', 'apikey': 'key'}, f)
+    yield stub
+    server.shutdown()
+
+
+def test_async_redash_as_completed_should_return_every_query(stub):
+    queries = [(query_id, {'station': station}) for query_id in (1, 2) for station in ('池袋', '渋谷', '新宿')]
+
+    async def run():
+        async with AsyncRedash(stub.credentials, max_concurrency=2) as redash:
+            return [result async for result in redash.as_completed(queries)]
+
+    results = asyncio.run(run())
+    assert sorted((query_id, params['station']) for (query_id, params), _ in results) \
+        == sorted((query_id, params['station']) for query_id, params in queries)
+    for (query_id, params), df in results:
+        assert isinstance(df, pd.DataFrame)
+        assert df['query_id'].tolist() == [query_id] * 3
+        assert df['station'].tolist() == [params['station']] * 3
+    assert stub.max_running <= 2
+
+
+def test_async_redash_query_many_should_keep_order(stub):
+    async def run():
+        async with AsyncRedash(stub.credentials) as redash:
+            return await redash.query_many([(3, {}), (1, {}), (2, {})])
+
+    dfs = asyncio.run(run())
+    assert [df['query_id'][0] for df in dfs] == [3, 1, 2]
+
+
+def test_async_redash_should_raise_failed_and_slow_jobs(stub):
+    stub.failing_query_id = 2
+
+    async def run(**kwargs):
+        async with AsyncRedash(stub.credentials, **kwargs) as redash:
+            return await redash.query_many([(1, {}), (2, {})], return_exceptions=True)
+
+    ok, failed = asyncio.run(run())
+    assert len(ok) == 3
+    assert 'relation does not exist' in str(failed)
+
+    slow, _ = asyncio.run(run(timeout=0.05))
+    assert isinstance(slow, TimeoutError)
@@ -4,6 +4,7 @@ import requests
 import json
 import sys
 sys.path.append('./')
+sys.path.append('../')  # for the modules shared by the wrappers, e.g. _disk_cache
 from src.redash import Redash
 
 creds = './credentials/secrets.json'
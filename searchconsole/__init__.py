@@ -1,2 +1,26 @@
-from .src.searchconsole import IbSearchConsole
-from .src.ib_url_filter import IbUrlFilter
\ No newline at end of file
+from typing import TYPE_CHECKING
+
+try:
+    from .._lazy import lazy_attributes
+except ImportError:
+    # Imported as a top-level package, with the repository root on sys.path.
+    from _lazy import lazy_attributes
+
+# `IbUrlFilter` only needs pandas, so avoid importing googleapiclient/oauth2client
+# through `IbSearchConsole` until it is actually used.
+_lazy_attributes = {
+    'IbSearchConsole': '.src.searchconsole',
+    'IbUrlFilter': '.src.ib_url_filter',
+    'SearchConsoleCache': '.src.cache',
+    'SearchConsoleSync': '.src.sync',
+}
+
+__all__ = list(_lazy_attributes)
+
+if TYPE_CHECKING:
+    from .src.searchconsole import IbSearchConsole
+    from .src.ib_url_filter import IbUrlFilter
+    from .src.cache import SearchConsoleCache
+    from .src.sync import SearchConsoleSync
+
+__getattr__, __dir__ = lazy_attributes(globals(), _lazy_attributes)
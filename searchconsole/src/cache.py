@@ -0,0 +1,82 @@
+import datetime
+import time
+from typing import Optional
+
+import pandas as pd
+
+try:
+    from ..._disk_cache import DiskCache
+except ImportError:
+    # `src` was imported on its own, as in the benchmarks, with the repository root on sys.path.
+    from _disk_cache import DiskCache
+
+
+class SearchConsoleCache(DiskCache):
+    """
+    A content-addressed on-disk cache for Search Console results.
+
+    Entries are keyed on the property URI and the normalized request body, and the
+    results are stored as Parquet files in `directory`. Search Console keeps revising
+    the last few days of data, so:
+        * results whose endDate is more than `mutable_days` days older than the day they
+        were fetched are final and never expire.
+        * everything else expires `ttl` seconds after it was fetched.
+    When the cache grows over `max_bytes`, the least recently used entries are evicted.
+
+    Usage:
+        cache = SearchConsoleCache('./cache/searchconsole', max_bytes=2 * 2**30)
+        sc = IbSearchConsole(credentials, site, cache=cache)
+        sc.get_top_queries(params={'startDate': '2020-03-01', 'endDate': '2020-03-31'})
+        cache.stats()
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 2**30,
+                 mutable_days: int = 3, ttl: int = 6 * 60 * 60) -> None:
+        """
+        Input:
+            - directory: where to store the cached results. Created if it does not exist.
+            - max_bytes: the maximum total size of the cached results.
+            - mutable_days: the number of most recent days that Search Console may still revise.
+            - ttl: how many seconds results that include mutable days are kept for.
+        """
+        super().__init__(directory, max_bytes)
+        self.mutable_days = mutable_days
+        self.ttl = ttl
+
+    def key(self, property_uri: str, request: dict, **options) -> str:
+        """Returns the cache key for `request` on `property_uri`.
+        `startRow` is dropped because results are cached as a whole. Any `options` that change
+        the result without being part of the request body, e.g. get_all, are part of the key."""
+        body = {key: value for key, value in request.items() if key != 'startRow'}
+        return self._hash({'property_uri': property_uri, 'request': body, 'options': options})
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        "Returns the cached DataFrame for `key`, or None if it is missing or expired."
+        data_path, meta_path = self._paths(key)
+        meta = self._load_json(meta_path)
+        if meta is not None and not meta['final'] and time.time() - meta['fetched_at'] > self.ttl:
+            self._remove(key)
+            meta = None
+
+        try:
+            df = pd.read_parquet(data_path) if meta is not None else None
+        except FileNotFoundError:
+            df = None
+        if df is None:
+            self._count(hit=False)
+            return None
+
+        self._touch(key)
+        self._count(hit=True)
+        return df
+
+    def put(self, key: str, request: dict, df: pd.DataFrame) -> None:
+        "Stores `df` as the result of `request` under `key`, then evicts entries over `max_bytes`."
+        fetched_on = datetime.date.today()
+        end_date = datetime.datetime.strptime(request['endDate'], '%Y-%m-%d').date()
+        meta = {
+            'fetched_at': time.time(),
+            'endDate': request['endDate'],
+            'final': end_date < fetched_on - datetime.timedelta(days=self.mutable_days),
+        }
+        self._write(key, lambda path: df.to_parquet(path, index=False), meta)
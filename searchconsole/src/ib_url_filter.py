@@ -3,7 +3,10 @@ import numpy as np
 import re
 from urllib.parse import urlparse
 import warnings
-from typing import List
+import json
+from typing import List, Optional
+
+from .slug_index import SlugIndex
 
 
 class IbUrlFilter:
@@ -21,38 +24,113 @@ class IbUrlFilter:
              'kyoto-kyoto', 'okayama-okayama', 'fukuoka-kitakyushu', 'fukuoka-fukuoka', 'kumamoto-kumamoto',
              'nigata-nigata', 'osaka-sakai', 'hokkaido-sapporo', 'kanagawa-sagamihara', 'hyogo-kobe']
 
+    page_types = ['category', 'feature', 'space', 'matome', 'generic', 'reviews', 'owners', 'guides',
+                  'toppage', 'other']
+    area_types = ['station', 'ward', 'area', 'prefecture', 'noarea']
+
+    # Words that make a page not generic, on top of the categories. See `isgeneric`.
+    generic_exclusions = ['list', 'matome', 'space', 'rooms', 'insurance', 'reviews', 'lines', 'privacy',
+                          'legal', 'blog', 'owners', 'owner', 'partner']
+
+    # Slugs are matched against whole path segments with a SlugIndex, which `load_slugs` rebuilds
+    # when the lists change. Only the structural parts of URLs are matched with regexes.
+    _category_index = SlugIndex(categories)
+    _prefecture_index = SlugIndex(prefectures)
+    _area_index = SlugIndex(areas)
+    _generic_exclusion_index = SlugIndex(categories + generic_exclusions)
+
+    # Compiled once when the class is loaded. Each page type is a named alternative, and as
+    # alternatives are tried in order, the first matching page type wins like in an if/elif chain.
+    # 'category' and 'generic' depend on the slugs, so `_page_type` checks them with the indexes.
+    _page_type_pattern = re.compile(
+        r'(?P<feature>.*\/list\/)'
+        r'|(?P<space>.*\/space\/\d+)'
+        r'|(?P<matome>.*\/matome\/)'
+        r'|(?P<reviews>.*\/reviews\/)'
+        r'|(?P<owners>.*\/owners\/)'
+        r'|(?P<guides>.*\/guides\/)'
+        r'|(?P<toppage>(https\:\/\/www\.instabase\.jp)?\/?$)'
+    )
+    _query_string_pattern = re.compile(r'\?\w')
+
+    # Used by `parse`.
+    _feature_pattern = re.compile(r'[\w\-]+')
+    _id_pattern = re.compile(r'\d+')
+    # A ward or station ID is a whole hyphen-separated token anywhere in a path segment,
+    # e.g. '/tokyo-w13101', '/chiba-w12221-rentalspace' or '/fukuoka-s9990505-salon'.
+    _suffix_pattern = re.compile(r'(?:^|\-)([ws])(\d+)(?=\-|$)')
+    _trailing_suffix_pattern = re.compile(r'\-[ws]\d+$')
+    _id_segments = {'space': 'space_id', 'matome': 'matome_id', 'reviews': 'review_id', 'owners': 'owner_id'}
+
+    # The columns returned by `parse`, and their dtypes.
+    parse_columns = {
+        'page_type': pd.CategoricalDtype(page_types),
+        'area_type': pd.CategoricalDtype(area_types),
+        'category': 'category',
+        'feature': object,
+        'space_id': 'Int64',
+        'matome_id': 'Int64',
+        'review_id': 'Int64',
+        'owner_id': 'Int64',
+        'prefecture': 'category',
+        'area': 'category',
+        'ward_id': 'Int64',
+        'station_id': 'Int64',
+    }
+
     @classmethod
     def istoppage(cls, values):
         return values.str.match(r'^(https\:\/\/www\.instabase\.jp)?\/$')
 
+    @classmethod
+    def load_slugs(cls, path: str) -> None:
+        """
+        Reloads the categories, prefectures and/or areas from a JSON file, e.g. when the site adds
+        new categories. Lists missing from the file are left as they are.
+        The file should be formatted as:
+
+        ```
+        {
+            "categories": ["kaigishitsu", "event-space", ...],
+            "prefectures": ["tokyo", ...],
+            "areas": ["chiba-chiba", ...]
+        }
+        ```
+        """
+        with open(path) as f:
+            config = json.load(f)
+
+        for name in ('categories', 'prefectures', 'areas'):
+            if name in config:
+                setattr(cls, name, list(config[name]))
+
+        cls._category_index = SlugIndex(cls.categories)
+        cls._prefecture_index = SlugIndex(cls.prefectures)
+        cls._area_index = SlugIndex(cls.areas)
+        cls._generic_exclusion_index = SlugIndex(cls.categories + cls.generic_exclusions)
+
     @classmethod
     def isgeneric(cls, values: pd.Series, exclude_homepage: bool = True) -> np.ndarray:
         """
-        Checks if input Series strings match generic page url patterns.
+        Checks if input Series strings match generic page url patterns, i.e. that none of their
+        path segments is a category or one of `generic_exclusions`, and that they have no query string.
         Returns boolean array of results.
         """
-        # Exclude top pages first by replacing them with the 'exclude' marker.
-        if exclude_homepage:
-            values = values.apply(lambda x: 'exclude' if x ==
-                                  'https://www.instabase.jp/' or x == '/' else x)
-
-        # Define patterns to filter out
-        patterns_to_filter_list = cls.categories + ['list', 'matome', 'space', 'rooms', 'insurance',
-                                                    'reviews', 'lines', 'privacy', 'legal', 'blog',
-                                                    'owners', 'owner', 'partner', 'exclude']
-        patterns_to_filter = r'.*(\?\w+|' + \
-            r'|'.join(patterns_to_filter_list).replace('-', r'\-') + r').*'
-        patterns_to_filter_compiled = re.compile(patterns_to_filter)
+        def is_generic(path):
+            if exclude_homepage and path in ('https://www.instabase.jp/', '/'):
+                return False
+            return cls._query_string_pattern.search(path) is None \
+                and cls._generic_exclusion_index.match(path) is None
 
-        return ~values.str.match(patterns_to_filter_compiled).values.ravel()
+        return cls._map_unique(values, is_generic, 'boolean').to_numpy(dtype=bool, na_value=False)
 
     @classmethod
     def iscategory(cls, values):
-        return values.str.match(r'.*(' + r'|'.join(cls.categories) + r').*')
+        return cls._map_unique(values, lambda path: cls._category_index.match(path) is not None, 'boolean')
 
     @classmethod
     def get_categories(cls, values):
-        return values.str.extract(r'.*(' + r'|'.join(cls.categories) + r').*')
+        return cls._map_unique(values, cls._category_index.match).to_frame(0)
 
     @classmethod
     def isfeature(cls, values):
@@ -96,57 +174,134 @@ class IbUrlFilter:
 
     @classmethod
     def get_page_types(cls, values):
+        "Returns the page type of each path as a categorical Series. See `page_types` for the possible values."
         cls._check_if_values_are_paths(values)
-
-        def determine_page_type(string):
-            if re.match(r'.*(' + '|'.join(cls.categories) + ').*', string):
-                return 'category'
-            elif re.match(r'.*\/list\/.*', string):
-                return 'feature'
-            elif re.match(r'.*\/space\/\d+.*', string):
-                return 'space'
-            elif re.match(r'.*\/matome\/.*', string):
-                return 'matome'
-            elif re.match(r'.*\/(' + r'|'.join(cls.prefectures) + r')' + r'(\-w\d+|\-s\d+)?$', string) or re.match(r'^\/(' + r'|'.join(cls.areas) + r')$', string):
-                return 'generic'
-            elif re.match(r'.*\/reviews\/.*', string):
-                return 'reviews'
-            elif re.match(r'.*\/owners\/.*', string):
-                return 'owners'
-            elif re.match(r'.*\/guides\/.*', string):
-                return 'guides'
-            elif re.match(r'^(https\:\/\/www\.instabase\.jp)?\/?$', string):
-                return 'toppage'
-            else:
-                return 'other'
-
-        return values.apply(determine_page_type)
+        return cls._map_unique(values, cls._page_type, pd.CategoricalDtype(cls.page_types))
 
     @classmethod
     def get_area_types(cls, values):
-        def determine_area_type(string):
-            if re.match(r'.*s\d+.*', string):
-                return 'station'
-            elif re.match(r'.*w\d+.*', string):
-                return 'ward'
-            elif re.match(r'.*(' + '|'.join(cls.areas).replace('-', r'\-') + r').*', string):
-                return 'area'
-            elif re.match(r'.*(' + '|'.join(cls.prefectures) + r').*', string):
-                return 'prefecture'
-            else:
-                return 'noarea'
+        "Returns the area type of each path as a categorical Series. See `area_types` for the possible values."
+        return cls._map_unique(values, cls._area_type, pd.CategoricalDtype(cls.area_types))
+
+    @classmethod
+    def _page_type(cls, path: str) -> str:
+        if cls._category_index.match(path) is not None:
+            return 'category'
+        page_type = cls._label(cls._page_type_pattern, path, 'other')
+        if page_type not in ('feature', 'space', 'matome') and cls._isgeneric_path(path):
+            return 'generic'
+        return page_type
+
+    @classmethod
+    def _isgeneric_path(cls, path: str) -> bool:
+        "A prefecture page, optionally for a ward or station such as '/tokyo-w13101', or an area page such as '/chiba-chiba'."
+        last_segment = cls._trailing_suffix_pattern.sub('', path.rsplit('/', 1)[-1])
+        return last_segment in cls._prefecture_index or (path[:1] == '/' and path[1:] in cls._area_index)
+
+    @classmethod
+    def _area_ids(cls, path: str) -> dict:
+        "Returns {'w': ward ID, 's': station ID} for the IDs found in `path`. The last one of each kind wins."
+        ids = {}
+        for segment in path.split('?', 1)[0].split('/'):
+            for match in cls._suffix_pattern.finditer(segment):
+                ids[match.group(1)] = int(match.group(2))
+        return ids
+
+    @classmethod
+    def _area_type(cls, path: str, area_ids: Optional[dict] = None) -> str:
+        # The same IDs as the ward_id and station_id of `parse`, so that the two always agree.
+        area_ids = cls._area_ids(path) if area_ids is None else area_ids
+        if 's' in area_ids:
+            return 'station'
+        if 'w' in area_ids:
+            return 'ward'
+        if cls._area_index.match(path) is not None:
+            return 'area'
+        if cls._prefecture_index.match(path) is not None:
+            return 'prefecture'
+        return 'noarea'
+
+    @classmethod
+    def _map_unique(cls, values, func, dtype=object) -> pd.Series:
+        """
+        Applies `func` once per unique value of `values`, and expands the results back to every row.
+        Page dumps repeat the same URLs many times, so this is much cheaper than `values.apply(func)`.
+        Missing values stay missing.
+        """
+        codes, uniques = pd.factorize(values)
+        mapped = pd.array([func(value) for value in uniques], dtype=dtype)
+        return pd.Series(mapped.take(codes, allow_fill=True),
+                         index=getattr(values, 'index', None), name=getattr(values, 'name', None))
+
+    @staticmethod
+    def _label(pattern, string, default):
+        "Returns the name of the group in `pattern` that matched `string`, or `default`."
+        match = pattern.match(string)
+        return match.lastgroup if match else default
+
+    @classmethod
+    def parse(cls, values: pd.Series) -> pd.DataFrame:
+        """
+        Extracts every URL feature in a single pass, instead of calling get_categories, get_features,
+        get_spaces, get_matomes, get_reviews, get_owners, get_prefectures, get_areas, get_wards,
+        get_stations, get_page_types and get_area_types one after another.
+        Each unique path is tokenized once, and the results are expanded back to every row.
+
+        Input:
+            - values: Series of paths, e.g. '/tokyo-s2600/kaigishitsu'.
+        Output:
+            - DataFrame with the columns and dtypes of `parse_columns`, indexed like `values`.
+            IDs such as '/space/123' and suffixes such as '-w13101' are returned as integers.
+        """
+        cls._check_if_values_are_paths(values)
+        codes, uniques = pd.factorize(values)
+        parsed = [cls._parse_path(path) for path in uniques]
+
+        df = pd.DataFrame(index=getattr(values, 'index', None))
+        for ix, (column, dtype) in enumerate(cls.parse_columns.items()):
+            unique_values = pd.array([row[ix] for row in parsed], dtype=dtype)
+            df[column] = unique_values.take(codes, allow_fill=True)
+        return df
+
+    @classmethod
+    def _parse_path(cls, path: str) -> tuple:
+        "Returns the values of `parse_columns` for a single path."
+        fields = dict.fromkeys(cls.parse_columns)
+        area_ids = cls._area_ids(path)
+        fields['page_type'] = cls._page_type(path)
+        fields['area_type'] = cls._area_type(path, area_ids)
+        fields['category'] = cls._category_index.match(path)
+        fields['prefecture'] = cls._prefecture_index.match(path, anchored=True)
+        fields['area'] = cls._area_index.match(path, anchored=True)
+
+        segments = path.split('?', 1)[0].split('/')
+        for ix, segment in enumerate(segments):
+            next_segment = segments[ix + 1] if ix + 1 < len(segments) else ''
+            if segment == 'list':
+                match = cls._feature_pattern.match(next_segment)
+                if match:
+                    fields['feature'] = match.group()
+            elif segment in cls._id_segments:
+                match = cls._id_pattern.match(next_segment)
+                if match:
+                    fields[cls._id_segments[segment]] = int(match.group())
+
+        fields['ward_id'] = area_ids.get('w')
+        fields['station_id'] = area_ids.get('s')
 
-        return values.apply(determine_area_type)
+        return tuple(fields.values())
 
     @classmethod
     def get_prefectures(cls, values):
+        "Returns the prefecture at the start of each path, e.g. 'tokyo' for '/tokyo-s2600/kaigishitsu'."
         cls._check_if_values_are_paths(values)
-        return values.str.extract(r'^\/(' + r'|'.join(cls.prefectures) + r').*')
+        return cls._map_unique(values, lambda path: cls._prefecture_index.match(path, anchored=True)).to_frame(0)
 
     @classmethod
     def get_areas(cls, values):
+        "Returns the area at the start of each path, e.g. 'chiba-chiba' for '/chiba-chiba/kaigishitsu'."
         cls._check_if_values_are_paths(values)
-        return values.str.extract(r'^\/(' + r'|'.join(cls.areas).replace('-', r'\-') + r').*')
+        return cls._map_unique(values, lambda path: cls._area_index.match(path, anchored=True)).to_frame(0)
 
     @classmethod
     def get_wards(cls, values):
@@ -2,13 +2,18 @@
 # Another example: https://github.com/googleapis/google-api-python-client/blob/master/samples/searchconsole/search_analytics_api_sample.py
 
 import datetime
-from typing import Callable
+import threading
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
 import pandas as pd
 import numpy as np
 
 from googleapiclient.discovery import build
 from oauth2client.service_account import ServiceAccountCredentials
 
+from .cache import SearchConsoleCache
+
 
 class IbSearchConsole:
     """
@@ -44,11 +49,20 @@ class IbSearchConsole:
     metrics: list = ['clicks', 'impressions', 'ctr', 'position']
     metrics_agg_dict: dict = {'clicks': 'sum',
                               'impressions': 'sum', 'ctr': 'mean', 'position': 'mean'}
+    # Dimensions with only a handful of distinct values. `to_df` stores them as categoricals.
+    categorical_dimensions: list = ['country', 'device', 'searchAppearance']
 
-    def __init__(self, credentials,url, ask_to_proceed=False):
-        
+    def __init__(self, credentials,url, ask_to_proceed=False, cache: Optional[SearchConsoleCache] = None):
+        """
+        Input:
+            - credentials: the path to the service account credentials JSON file.
+            - url: the Search Console property, e.g. 'https://www.instabase.jp/'.
+            - ask_to_proceed: ask on the command line before fetching each following page.
+            - cache: optional. A SearchConsoleCache that `get` reads results from and stores them in.
+        """
         self.scope = ["https://www.googleapis.com/auth/webmasters","https://www.googleapis.com/auth/webmasters.readonly"]
         self.credentials = ServiceAccountCredentials.from_json_keyfile_name(credentials,self.scope)
+        self._local = threading.local()
         self.refresh_token()
 
         self.property_uri = url
@@ -59,11 +73,19 @@ class IbSearchConsole:
             'rowLimit': 5000,
         }
         self.ask_to_proceed = ask_to_proceed
+        self.cache = cache
         print("Default query params set. startDate and endDate are set to the past 30 days by default. Overwrite as needed.")
         
     def refresh_token(self):
         self.api = build('webmasters', 'v3', credentials=self.credentials)
-        
+
+    def _thread_api(self):
+        """Returns an API client owned by the current thread.
+        The discovery client is not thread-safe, so every worker thread builds its own."""
+        if not hasattr(self._local, 'api'):
+            self._local.api = build('webmasters', 'v3', credentials=self.credentials)
+        return self._local.api
+
     @property
     def list_dimensions(self):
         "Returns list of legal values for dimensions."
@@ -95,25 +117,203 @@ class IbSearchConsole:
         except Exception as e:
             print(e)
 
-    def get(self, dimensions=['query'], filters=[], params={}, get_all=False):
-        "Gets top 10 queries for the date range, sorted by click count, descending."
+    def get(self, dimensions=['query'], filters=[], params={}, get_all=False,
+            shard_days=None, max_workers=4):
+        """Gets top 10 queries for the date range, sorted by click count, descending.
+        Results are read from and stored in `self.cache` when it is set.
+        Input:
+            - dimensions, filters, params: see `build_request`.
+            - get_all: paginate until rowLimit is reached instead of fetching a single page.
+            - shard_days: optional. Splits the startDate-endDate window into shards of
+            `shard_days` days that are fetched concurrently, each paginated on its own.
+            The rowLimit applies to each shard, and every row carries the startDate and
+            endDate of the shard it came from.
+            - max_workers: the maximum number of shards fetched at the same time. Keep this
+            low to stay within the Search Console API quota.
+        Output:
+            - Pandas DataFrame.
+        """
+
+        self.req = self._build_get_request(dimensions, filters, params)
 
-        self.req = self.build_request([
-            {'dimensions': dimensions},
-            {'dimensionFilterGroups': [{'filters': filters}]},
-            params,
-        ])
+        # Pass a copy to the cache, since fetching caps the rowLimit of self.req.
+        return self._cached(self.req.copy(),
+                            lambda: self._get(self.req, get_all, shard_days, max_workers),
+                            get_all=bool(get_all), shard_days=shard_days)
+
+    def _cached(self, request, fetch, **options):
+        """Returns the cached result of `request` if there is one, and otherwise calls `fetch`
+        and caches what it returns. `options` are passed on to `SearchConsoleCache.key`."""
+        if self.cache is None:
+            return fetch()
+
+        key = self.cache.key(self.property_uri, request, **options)
+        df = self.cache.get(key)
+        if df is None:
+            df = fetch()
+            self.cache.put(key, request, df)
+        else:
+            print(f"Loaded the result for {request['startDate']} - {request['endDate']} from the cache.")
+        return df
+
+    def _get(self, request, get_all=False, shard_days=None, max_workers=4):
+        "Fetches `request` from the API. See `get` for the arguments."
+        if shard_days:
+            return self.get_sharded(request, shard_days=shard_days, max_workers=max_workers)
 
         if get_all:
-            self.res = self.execute_request_all(self.req)
+            self.res = self.execute_request_all(request)
             response_rows = []
             for response in self.res:
                 response_rows.extend(response['rows'])
         else:
-            response = self.execute_request(request=self.req)
+            response = self.execute_request(request=request)
             response_rows = response['rows']
 
-        return self.to_df(response_rows)
+        return self.to_df(response_rows, request=request)
+
+    def _build_get_request(self, dimensions, filters, params):
+        "Builds the request used by `get` and the streaming methods."
+        return self.build_request([
+            {'dimensions': dimensions},
+            {'dimensionFilterGroups': [{'filters': filters}]},
+            params,
+        ])
+
+    def get_sharded(self, request, shard_days=1, max_workers=4):
+        """Fetches `request` in date shards on a bounded thread pool and concatenates the results.
+        Input:
+            - request: a request dictionary, e.g. from `build_request`.
+            - shard_days: the number of days covered by each shard.
+            - max_workers: the maximum number of shards fetched at the same time.
+        Output:
+            - Pandas DataFrame with the rows of all shards, in date order.
+        """
+        shard_requests = [
+            dict(request, startDate=start_date, endDate=end_date)
+            for start_date, end_date in self._date_shards(request['startDate'], request['endDate'], shard_days)
+        ]
+        print(f"Fetching {len(shard_requests)} shards with up to {max_workers} workers.")
+
+        def fetch_shard(shard_request):
+            responses = self._iter_responses(shard_request,
+                                             api=self._thread_api(),
+                                             num_retries=5,
+                                             prefix=f"[{shard_request['startDate']} - {shard_request['endDate']}] ")
+            response_rows = [row for response in responses for row in response['rows']]
+            if not response_rows:
+                return None
+            return self.to_df(response_rows, request=shard_request)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            frames = [df for df in executor.map(fetch_shard, shard_requests) if df is not None]
+
+        assert len(frames) > 0, "Response should not be empty."
+        return pd.concat(frames, axis=0, ignore_index=True)
+
+    @staticmethod
+    def _date_shards(start_date, end_date, shard_days=1):
+        """Splits the inclusive date range into consecutive (startDate, endDate) pairs of `shard_days` days.
+        E.g., _date_shards('2020-03-01', '2020-03-05', 2)
+            #=> [('2020-03-01', '2020-03-02'), ('2020-03-03', '2020-03-04'), ('2020-03-05', '2020-03-05')]
+        """
+        assert shard_days >= 1, "shard_days must be at least 1."
+        start = datetime.datetime.strptime(start_date, '%Y-%m-%d')
+        end = datetime.datetime.strptime(end_date, '%Y-%m-%d')
+        assert start <= end, "startDate must not be after endDate."
+
+        shards = []
+        while start <= end:
+            shard_end = min(start + datetime.timedelta(days=shard_days - 1), end)
+            shards.append((start.strftime('%Y-%m-%d'), shard_end.strftime('%Y-%m-%d')))
+            start = shard_end + datetime.timedelta(days=1)
+        return shards
+
+    def iter_rows(self, dimensions=['query'], filters=[], params={}):
+        """Yields response rows as the pages arrive, without keeping earlier pages in memory.
+        Takes the same arguments as `get`, and paginates until rowLimit is reached.
+        Usage:
+            for row in sc.iter_rows(dimensions=['query', 'page'], params={'rowLimit': 100_000}):
+                print(row['keys'], row['clicks'])
+        """
+        request = self._build_get_request(dimensions, filters, params)
+        yield from self._iter_rows(request)
+
+    def _iter_rows(self, request):
+        for response in self._iter_responses(request, ask_to_proceed=self.ask_to_proceed):
+            yield from response['rows']
+
+    def iter_frames(self, dimensions=['query'], filters=[], params={}, chunk_rows=5000):
+        """Yields DataFrames of up to `chunk_rows` rows as the pages arrive.
+        Peak memory is bounded by one chunk rather than by the whole result.
+        Usage:
+            for df in sc.iter_frames(dimensions=['query', 'page'], params={'rowLimit': 100_000}):
+                ...
+        """
+        assert chunk_rows > 0, "chunk_rows must be positive."
+        request = self._build_get_request(dimensions, filters, params)
+
+        chunk = []
+        for row in self._iter_rows(request):
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                yield self.to_df(chunk, request=request)
+                chunk = []
+        if chunk:
+            yield self.to_df(chunk, request=request)
+
+    def save(self, path, dimensions=['query'], filters=[], params={}, chunk_rows=5000):
+        """Streams the result of a query straight to a file, one chunk at a time.
+        Input:
+            - path: destination file. The format is chosen by the extension, '.parquet' or '.csv'.
+            Writing Parquet requires pyarrow.
+            - dimensions, filters, params: see `get`.
+            - chunk_rows: see `iter_frames`.
+        Output:
+            - The number of rows written.
+        """
+        frames = self.iter_frames(dimensions=dimensions, filters=filters,
+                                  params=params, chunk_rows=chunk_rows)
+
+        if path.endswith('.parquet'):
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise ImportError("Saving to Parquet requires pyarrow. Run `pip install pyarrow`.")
+
+            writer = None
+            total_rows = 0
+            try:
+                for df in frames:
+                    table = pa.Table.from_pandas(df, preserve_index=False)
+                    if writer is None:
+                        # The index width of a categorical column depends on the number of categories
+                        # in each chunk, so fix it for the file, or the later chunks cannot be cast.
+                        schema = pa.schema([
+                            field.with_type(pa.dictionary(pa.int32(), pa.string()))
+                            if pa.types.is_dictionary(field.type) else field
+                            for field in table.schema
+                        ], metadata=table.schema.metadata)
+                        writer = pq.ParquetWriter(path, schema)
+                    writer.write_table(table.cast(writer.schema))
+                    total_rows += len(df)
+            finally:
+                if writer is not None:
+                    writer.close()
+
+        elif path.endswith('.csv'):
+            total_rows = 0
+            for df in frames:
+                df.to_csv(path, mode='w' if total_rows == 0 else 'a',
+                          header=total_rows == 0, index=False)
+                total_rows += len(df)
+
+        else:
+            raise ValueError(f"Unsupported file extension: {path}. Use '.parquet' or '.csv'.")
+
+        print(f"Saved {total_rows} rows to {path}.")
+        return total_rows
 
     def get_top_queries(self, dimensions=['query'], filters=[], params={}, get_all=False):
         "Convenience method for fetching top queries."
@@ -139,10 +339,8 @@ class IbSearchConsole:
             An array of response rows.
         """
         self.req = request
-        property_uri = property_uri or self.property_uri
         self.req['rowLimit'] = 5000 if self.req['rowLimit'] > 5000 else self.req['rowLimit']
-        self.response = self.api.searchanalytics().query(
-            siteUrl=property_uri, body=self.req).execute()
+        self.response = self._query(self.req, property_uri=property_uri)
 
         tot_rows_fetched = 0
         if 'rows' in self.response:
@@ -152,6 +350,15 @@ class IbSearchConsole:
             print(f"The request did not return any rows.")
         return self.response
 
+    def _query(self, request, api=None, property_uri=None, num_retries=0):
+        """Sends a single searchAnalytics.query request without touching the instance state,
+        so that it can be called from worker threads with their own `api` client.
+        `num_retries` retries rate-limited and server errors with exponential backoff."""
+        api = api or self.api
+        property_uri = property_uri or self.property_uri
+        return api.searchanalytics().query(
+            siteUrl=property_uri, body=request).execute(num_retries=num_retries)
+
     def execute_request_all(self, request):
         """Loops execute_request until the required number of rows are fetched.
         Input:
@@ -159,52 +366,48 @@ class IbSearchConsole:
         Output:
             - A list of responses from API
         """
-
-        assert 'rowLimit' in request.keys(), "Request does not include a rowLimit."
         self.req = request
-        row_limit = self.req['rowLimit']
-
-        if row_limit > 5000:
-            self.req['rowLimit'] = 5000
-
         all_responses = []
-        rows_fetched = 0
+        for response in self._iter_responses(self.req, ask_to_proceed=self.ask_to_proceed):
+            self.response = response
+            all_responses.append(response)
+        return all_responses
+
+    def _iter_responses(self, request, api=None, ask_to_proceed=False, num_retries=0, prefix=''):
+        """Yields the responses for `request` page by page, 5000 rows at a time, until its rowLimit is reached.
+        Only responses that contain rows are yielded.
+        Input:
+            - request: a request dictionary that includes a rowLimit.
+            - api: optional API client. Worker threads must pass their own.
+            - ask_to_proceed: ask on the command line before fetching each following page.
+            - num_retries: see `_query`.
+            - prefix: a string prepended to progress messages, e.g. to tell shards apart.
+        """
+        assert 'rowLimit' in request.keys(), "Request does not include a rowLimit."
+        row_limit = request['rowLimit']
         index = 0
 
         while True:
-            self.response = self.execute_request(
-                request=self.build_request([
-                    self.req,
-                    {'startRow': index}
-                ])
-            )
-            if 'rows' in self.response:
-                rows_fetched = len(self.response['rows'])
-                index += rows_fetched
-                all_responses.append(self.response)
-
-                print(
-                    f"Got {rows_fetched} rows. Total of {index} rows fetched.")
-
-                if rows_fetched < 5000:  # the max rows that can be fetched at once through the API.
-                    print(
-                        "There seems to be no more rows to be fetched. Completing the query.")
-                    break
-                else:
-                    if index >= row_limit:
-                        print("The rowLimit was reached. Completing the query.")
-                        break
-                    else:
-                        if self.ask_to_proceed:
-                            if input("Continue? [Y/n] ") in ('Y', 'y'):
-                                continue
-                            else:
-                                break
-            else:
-                print(
-                    f"No more rows were fetched. Ending query with {rows_fetched} rows.")
-                break
-        return all_responses
+            page_request = dict(request, startRow=index, rowLimit=min(row_limit, 5000))
+            response = self._query(page_request, api=api, num_retries=num_retries)
+            if 'rows' not in response:
+                print(f"{prefix}No more rows were fetched. Ending query with {index} rows.")
+                return
+
+            rows_fetched = len(response['rows'])
+            index += rows_fetched
+            yield response
+
+            print(f"{prefix}Got {rows_fetched} rows. Total of {index} rows fetched.")
+
+            if rows_fetched < 5000:  # the max rows that can be fetched at once through the API.
+                print(f"{prefix}There seems to be no more rows to be fetched. Completing the query.")
+                return
+            if index >= row_limit:
+                print(f"{prefix}The rowLimit was reached. Completing the query.")
+                return
+            if ask_to_proceed and input("Continue? [Y/n] ") not in ('Y', 'y'):
+                return
 
     def build_request(self, params=[]):
         """
@@ -255,10 +458,13 @@ class IbSearchConsole:
         filters.append(new_filter)
         return filters
 
-    def to_df(self, response_rows):
+    def to_df(self, response_rows, request=None):
         """Returns a DataFrame version of response.
+        Key columns are named after the requested dimensions, e.g. 'query' and 'page'.
+        Low-cardinality dimensions listed in `categorical_dimensions` are stored as categoricals.
         Input:
             - response_rows: the rows returned from the response.
+            - request: optional. The request the rows were fetched with. Defaults to the last request, self.req.
         Output:
             - Pandas DataFrame version of the response.
         """
@@ -266,29 +472,32 @@ class IbSearchConsole:
         assert len(response_rows) > 0, "Response should not be empty."
         assert 'keys' in response_rows[0], "Response item did not have the key 'keys'."
 
-        df = pd.DataFrame(response_rows)
-
-        # Split keys into separate columns if key has multiple dimensions in it.
-        keys = np.array(df['keys'].tolist())
-        if len(keys[0]) > 1:
-            # Keep track of key columns so that we can put them back into order later.
-            for ix in range(len(keys[0])):
-                df[f'key_{ix}'] = keys[:, ix]
-            df.drop('keys', axis=1, inplace=True)
-        else:
-            df['keys'] = df['keys'].apply(lambda x: x[0])
-
-        df['startDate'] = self.req['startDate']
-        df['endDate'] = self.req['endDate']
+        request = request or self.req
+        n_rows = len(response_rows)
+        n_keys = len(response_rows[0]['keys'])
+        dimensions = request.get('dimensions') or [f'key_{ix}' for ix in range(n_keys)]
+        assert len(dimensions) == n_keys, "The number of keys does not match the requested dimensions."
+
+        # Build every column straight from the rows instead of going through a DataFrame of dicts.
+        # `itemgetter` keeps the per-row work in C.
+        keys = list(map(itemgetter('keys'), response_rows))
+        columns = {}
+        for ix, dimension in enumerate(dimensions):
+            values = list(map(itemgetter(ix), keys))
+            if dimension in self.categorical_dimensions:
+                columns[dimension] = pd.Categorical(values)
+            else:
+                columns[dimension] = values
 
-        # Get columns so that we can get columns in the right order.
-        date_cols = [col for col in df.columns if col.endswith('Date')]
-        key_cols = [col for col in df.columns if col.startswith('key')]
-        metric_cols = self.list_metrics
-        col_order = date_cols + key_cols + metric_cols
+        metric_values = np.array(list(map(itemgetter(*self.list_metrics), response_rows)),
+                                 dtype=np.float64).reshape(n_rows, len(self.list_metrics))
+        for ix, metric in enumerate(self.list_metrics):
+            columns[metric] = metric_values[:, ix]
 
-        # Return DataFrame with col_order
-        return df[col_order]
+        df = pd.DataFrame(columns)
+        df.insert(0, 'startDate', request['startDate'])
+        df.insert(1, 'endDate', request['endDate'])
+        return df
 
     def get_dates_with_data(self, params={}):
         """Run to learn which dates have data.
@@ -315,6 +524,10 @@ class IbSearchConsole:
     def compare_top_queries(self, period1_start=None, period1_end=None,
                             period2_start=None, period2_end=None,
                             dimensions=['query'], filters=[], params={}, get_all=False):
+        """
+        Compares two periods side by side. Period 2 defaults to period 1 shifted a week back.
+        Both periods are fetched at the same time; see `compare_periods` for the output format.
+        """
 
         # Set the periods to compare
         assert (period1_start != None) & (
@@ -331,72 +544,157 @@ class IbSearchConsole:
             period2_end = (period1_end_as_datetime -
                            datetime.timedelta(days=7)).strftime('%Y-%m-%d')
 
-        # Fetch responses as Data Frames
-        params.update({
-            'startDate': period1_start,
-            'endDate': period1_end
-        })
-        df1 = self.get_top_queries(
-            dimensions=dimensions,
-            filters=filters,
-            params=params,
-            get_all=True
-        )
-
-        params.update({
-            'startDate': period2_start,
-            'endDate': period2_end
-        })
-        df2 = self.get_top_queries(
-            dimensions=dimensions,
-            filters=filters,
-            params=params,
-            get_all=True
-        )
-
-        # Return merged Data Frame
-        cols1 = [col for col in df1.columns if col.startswith('key')]
-        cols2 = [col for col in df2.columns if col.startswith('key')]
-        df = pd.merge(df1, df2, how='outer', left_on=cols1,
-                      right_on=cols2, suffixes=['_1', '_2'])
+        return self.compare_periods([(period1_start, period1_end), (period2_start, period2_end)],
+                                    dimensions=dimensions,
+                                    filters=filters,
+                                    params=params)
 
-        return df
+    def compare_periods(self, periods, dimensions=['query'], filters=[], params={}, max_workers=4):
+        """
+        Fetches several periods concurrently and returns them as one wide comparison table.
+
+        Input:
+            - periods: list of (startDate, endDate) tuples, e.g. from `weekly_periods`.
+            - dimensions, filters, params: see `get`. All rows up to rowLimit are fetched for each period.
+            - max_workers: the maximum number of periods fetched at the same time.
+        Output:
+            - DataFrame with one row per combination of dimension values seen in any period, and
+            startDate_i, endDate_i and metric_i columns for the i-th period (starting from 1).
+            Metrics are NaN where the keys did not appear in that period.
+        Usage:
+            df = sc.compare_periods(sc.weekly_periods(8), dimensions=['query', 'page'])
+        """
+        requests = [self._build_get_request(dimensions, filters, dict(params, startDate=start_date, endDate=end_date))
+                    for start_date, end_date in periods]
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            frames = list(executor.map(self._get_period, requests))
+
+        return self._join_periods(frames, dimensions, periods)
+
+    def weekly_periods(self, n_weeks=8, end_date=None):
+        """Returns the (startDate, endDate) tuples of the last `n_weeks` 7-day periods, most recent first.
+        end_date defaults to the endDate of `default_query_params`, i.e. yesterday."""
+        end = datetime.datetime.strptime(end_date or self.default_query_params['endDate'], '%Y-%m-%d')
+        periods = []
+        for week in range(n_weeks):
+            period_end = end - datetime.timedelta(days=7 * week)
+            period_start = period_end - datetime.timedelta(days=6)
+            periods.append((period_start.strftime('%Y-%m-%d'), period_end.strftime('%Y-%m-%d')))
+        return periods
+
+    def _get_period(self, request):
+        """Fetches all rows of `request` on a worker thread, using the cache when set.
+        Returns an empty DataFrame with the usual columns if there are no rows."""
+        def fetch():
+            responses = self._iter_responses(request,
+                                             api=self._thread_api(),
+                                             num_retries=5,
+                                             prefix=f"[{request['startDate']} - {request['endDate']}] ")
+            response_rows = [row for response in responses for row in response['rows']]
+            if not response_rows:
+                return pd.DataFrame(columns=['startDate', 'endDate'] + request['dimensions'] + self.list_metrics)
+            return self.to_df(response_rows, request=request)
+
+        return self._cached(dict(request), fetch, get_all=True, shard_days=None)
+
+    def _join_periods(self, frames, dimensions, periods):
+        """
+        Outer-joins per-period frames on `dimensions` into one wide frame.
+        Instead of merging on object columns, the dimension values of all frames are factorized
+        to integer codes once, and each period's metrics are scattered into preallocated columns.
+        Dimension values are assumed to be unique within each frame.
+        """
+        n_rows = sum(len(df) for df in frames)
+
+        # Combine the codes of every dimension into a single integer key per row.
+        # Re-factorizing after each dimension keeps the keys below n_rows, so they never overflow.
+        row_keys = np.zeros(n_rows, dtype=np.int64)
+        key_values = {}
+        for dimension in dimensions:
+            values = pd.concat([df[dimension].astype(object) for df in frames], ignore_index=True)
+            codes, uniques = pd.factorize(values)
+            row_keys, _ = pd.factorize(row_keys * len(uniques) + codes)
+            key_values[dimension] = values
+
+        # The first row of each key is used to decode the dimension values of the output.
+        _, first_rows = np.unique(row_keys, return_index=True)
+        n_keys = len(first_rows)
+
+        columns = {}
+        for dimension in dimensions:
+            values = key_values[dimension].to_numpy()[first_rows]
+            columns[dimension] = pd.Categorical(values) if dimension in self.categorical_dimensions else values
+
+        offset = 0
+        for ix, (df, (start_date, end_date)) in enumerate(zip(frames, periods), start=1):
+            period_keys = row_keys[offset:offset + len(df)]
+            offset += len(df)
+            columns[f'startDate_{ix}'] = np.full(n_keys, start_date, dtype=object)
+            columns[f'endDate_{ix}'] = np.full(n_keys, end_date, dtype=object)
+            for metric in self.list_metrics:
+                values = np.full(n_keys, np.nan)
+                values[period_keys] = df[metric].to_numpy(dtype=np.float64)
+                columns[f'{metric}_{ix}'] = values
+
+        return pd.DataFrame(columns)
 
     def _compute_relative_importance(self, df, importance_col):
         return (df[importance_col] / df[importance_col].sum()).fillna(0)
 
-    def most_important_changes_in(self, df, changes_col='clicks', importance_col='clicks_1'):
+    def most_important_changes_in(self, df, changes_col='clicks', importance_col='clicks_1',
+                                  top_k=None, with_newcomers_and_drops=False):
         """
         Returns the most important changes in changes_col, weighted by the importance_col.
-        The method excludes rows with values of np.inf, which are treated as "new comers",
-        and np.nan which are treated as "drops".
+        The log change cannot be computed for "new comers", which have a value in period 1
+        but none (or zero) in period 2, nor for "drops", which are the other way around.
+        They are excluded from the changes, and returned separately if `with_newcomers_and_drops` is set.
 
         Inputs:
-            - df: DataFrame
+            - df: DataFrame, e.g. from `compare_top_queries`.
+            - changes_col: the metric to compare between period 1 and period 2; e.g., 'clicks'
             - importance_col: the DataFrame column to use for weighting; e.g., 'clicks_1'
+            - top_k: optional. Only return the `top_k` changes with the largest absolute weighted log change.
+            - with_newcomers_and_drops: also return the new comers and drops.
         Output:
-            - DataFrame with the most important changes
+            - DataFrame with the most important changes, sorted by log_change, descending.
+            - If with_newcomers_and_drops is set, a tuple of (changes, newcomers, drops) DataFrames instead.
+            Newcomers are sorted by the period 1 value and drops by the period 2 value, descending.
         Usage:
             - e.g., df_with_importance = sc.most_important_changes_in(df,
                                             changes_col='clicks',
                                             importance_col='impressions_1')
+            - e.g., changes, newcomers, drops = sc.most_important_changes_in(df, top_k=100,
+                                                    with_newcomers_and_drops=True)
         """
 
         assert changes_col in self.list_metrics, f"changes_col is invalid. Choose from {self.list_metrics}"
         assert importance_col in df.columns, "importance_col not found in df.columns"
 
-        df = df.copy()
-        df['importance'] = self._compute_relative_importance(
-            df, importance_col)
-
-        df['log_change'] = np.log(
-            df[f'{changes_col}_1'] / df[f'{changes_col}_2']) * df['importance']
-
-        # Drop rows with np.inf or np.nan
-        df.drop(df[df['log_change'] == np.inf].index, inplace=True)
-        df.drop(df[df['log_change'] == -np.inf].index, inplace=True)
-        df.dropna(inplace=True)
-
-        df.sort_values('log_change', ascending=False, inplace=True)
-
-        return df
+        current = df[f'{changes_col}_1'].to_numpy(dtype=np.float64)
+        previous = df[f'{changes_col}_2'].to_numpy(dtype=np.float64)
+        importance = self._compute_relative_importance(df, importance_col).to_numpy(dtype=np.float64)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_change = np.log(current / previous) * importance
+
+        # A single mask drops np.inf, -np.inf and np.nan at once.
+        index = np.flatnonzero(np.isfinite(log_change))
+        if top_k is not None and top_k < len(index):
+            # Partial selection of the largest absolute changes, without sorting every row.
+            largest = np.argpartition(-np.abs(log_change[index]), top_k - 1)[:top_k]
+            index = index[largest]
+        index = index[np.argsort(-log_change[index], kind='stable')]
+
+        changes = df.iloc[index].assign(importance=importance[index],
+                                        log_change=log_change[index])
+        if not with_newcomers_and_drops:
+            return changes
+
+        # Comparisons with np.nan are False, so missing values count as absent.
+        newcomers = np.flatnonzero((current > 0) & ~(previous > 0))
+        newcomers = newcomers[np.argsort(-current[newcomers], kind='stable')]
+        drops = np.flatnonzero((previous > 0) & ~(current > 0))
+        drops = drops[np.argsort(-previous[drops], kind='stable')]
+
+        return changes, df.iloc[newcomers], df.iloc[drops]
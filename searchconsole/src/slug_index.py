@@ -0,0 +1,53 @@
+from typing import Iterable, Optional
+
+
+class SlugIndex:
+    """
+    A hash index of hyphenated slugs, such as 'kaigishitsu', 'event-space' or 'chiba-chiba',
+    that are matched against whole path segments instead of arbitrary substrings.
+
+    A path segment is split into hyphen-separated tokens, and every run of up to as many tokens
+    as the longest slug is looked up in a set. Matching is therefore linear in the length of the
+    path, never backtracks, and only matches whole tokens: 'nara' does not match 'narashino'.
+
+    Usage:
+        index = SlugIndex(['space', 'event-space'])
+        index.match('/tokyo/event-space')       #=> 'event-space'
+        index.match('/tokyo-event-space-s2600') #=> 'event-space'
+        index.match('/tokyo/spaces')            #=> None
+    """
+
+    def __init__(self, slugs: Iterable[str]) -> None:
+        self.slugs = frozenset(slugs)
+        self.max_tokens = max((slug.count('-') + 1 for slug in self.slugs), default=0)
+
+    def __contains__(self, slug: str) -> bool:
+        return slug in self.slugs
+
+    def __len__(self) -> int:
+        return len(self.slugs)
+
+    def match(self, path: str, anchored: bool = False) -> Optional[str]:
+        """
+        Returns the slug in `path` made of the most tokens, or None if there is none.
+        Ties go to the rightmost match. The query string is ignored.
+        Input:
+            - path: e.g. '/tokyo-s2600/kaigishitsu'.
+            - anchored: only match slugs at the start of the first path segment.
+        """
+        segments = [segment for segment in path.split('?', 1)[0].split('/') if segment]
+        if anchored:
+            segments = segments[:1]
+
+        best, best_tokens = None, 0
+        for segment in segments:
+            tokens = segment.split('-')
+            for start in ([0] if anchored else range(len(tokens))):
+                for n_tokens in range(min(self.max_tokens, len(tokens) - start), 0, -1):
+                    if n_tokens < best_tokens:
+                        break
+                    candidate = '-'.join(tokens[start:start + n_tokens])
+                    if candidate in self.slugs:
+                        best, best_tokens = candidate, n_tokens
+                        break
+        return best
@@ -0,0 +1,163 @@
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import shutil
+from urllib.parse import quote
+
+import pandas as pd
+
+from .searchconsole import IbSearchConsole
+
+
+class SearchConsoleSync:
+    """
+    Keeps a local copy of Search Console data up to date, one Parquet partition per date.
+
+    Each run asks Search Console which dates have data, then only fetches the dates that are
+    missing locally or that were fetched while Search Console could still revise them, and
+    rewrites just those partitions. A daily job therefore costs one or two days of API calls.
+
+    Layout:
+        <root>/<property>/<dimensions>/date=YYYY-MM-DD/part.parquet
+        <root>/<property>/<dimensions>/_manifest.json
+
+    Usage:
+        sc = IbSearchConsole(credentials, 'https://www.instabase.jp/')
+        sync = SearchConsoleSync(sc, './data/searchconsole', dimensions=['query', 'page'])
+        sync.sync()
+        df = sync.read(start_date='2020-03-01', end_date='2020-03-31')
+
+    It can also be run from the command line:
+        python -m searchconsole.src.sync CREDENTIALS URL ROOT --dimensions query page
+    """
+
+    def __init__(self, sc: IbSearchConsole, root: str, dimensions: list = ['query'],
+                 filters: list = [], mutable_days: int = 3, row_limit: int = 100_000) -> None:
+        """
+        Input:
+            - sc: the IbSearchConsole to fetch data with.
+            - root: the directory of the local store.
+            - dimensions: the dimensions to store. Each set of dimensions is stored separately.
+            - filters: optional filters, e.g. from `sc.add_filter`. Filtered data is stored separately, too.
+            - mutable_days: the number of most recent days that Search Console may still revise.
+            - row_limit: the maximum number of rows to fetch per date.
+        """
+        self.sc = sc
+        self.dimensions = list(dimensions)
+        self.filters = list(filters)
+        self.mutable_days = mutable_days
+        self.row_limit = row_limit
+
+        dataset = '+'.join(self.dimensions)
+        if self.filters:
+            filters_hash = hashlib.sha1(json.dumps(self.filters, sort_keys=True).encode('utf-8')).hexdigest()
+            dataset += f'-{filters_hash[:8]}'
+        self.directory = os.path.join(root, quote(sc.property_uri, safe=''), dataset)
+        self.manifest_path = os.path.join(self.directory, '_manifest.json')
+        os.makedirs(self.directory, exist_ok=True)
+
+    @property
+    def manifest(self) -> dict:
+        "Returns {date: {'fetched_on': date, 'rows': int, 'final': bool}} for every stored date."
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def dates_to_fetch(self, start_date: str, end_date: str) -> list:
+        "Returns the dates between start_date and end_date that have data but are missing or not final locally."
+        dates_with_data = self.sc.get_dates_with_data(params={
+            'startDate': start_date,
+            'endDate': end_date,
+        })['date'].tolist()
+
+        manifest = self.manifest
+        return sorted(date for date in set(dates_with_data)
+                      if date not in manifest or not manifest[date]['final'])
+
+    def sync(self, start_date: str = None, end_date: str = None) -> list:
+        """Fetches new and still mutable dates and rewrites their partitions.
+        Input:
+            - start_date, end_date: the window to check, formatted as '2020-03-31'.
+            Defaults to the same past 30 days as `sc.default_query_params`.
+        Output:
+            - The list of dates that were fetched.
+        """
+        start_date = start_date or self.sc.default_query_params['startDate']
+        end_date = end_date or self.sc.default_query_params['endDate']
+
+        dates = self.dates_to_fetch(start_date, end_date)
+        print(f"{len(dates)} dates to fetch between {start_date} and {end_date}.")
+
+        manifest = self.manifest
+        today = datetime.date.today()
+        for date in dates:
+            rows = self._write_partition(date)
+            is_final = datetime.datetime.strptime(date, '%Y-%m-%d').date() \
+                < today - datetime.timedelta(days=self.mutable_days)
+            manifest[date] = {'fetched_on': today.strftime('%Y-%m-%d'), 'rows': rows, 'final': is_final}
+
+            # Save after every date so that an interrupted run does not refetch finished dates.
+            self._save_manifest(manifest)
+            print(f"Synced {rows} rows for {date}.")
+
+        return dates
+
+    def read(self, start_date: str = None, end_date: str = None) -> pd.DataFrame:
+        "Returns the stored data between start_date and end_date (inclusive) as a single DataFrame."
+        dates = sorted(date for date, entry in self.manifest.items()
+                       if entry['rows'] > 0
+                       and (start_date is None or date >= start_date)
+                       and (end_date is None or date <= end_date))
+        frames = [pd.read_parquet(self._partition_path(date)) for date in dates]
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, axis=0, ignore_index=True)
+
+    def _write_partition(self, date: str) -> int:
+        "Fetches a single date and replaces its partition. Returns the number of rows written."
+        path = self._partition_path(date)
+        partition = os.path.dirname(path)
+        frames = list(self.sc.iter_frames(dimensions=self.dimensions,
+                                          filters=self.filters,
+                                          params={'startDate': date, 'endDate': date,
+                                                  'rowLimit': self.row_limit}))
+        if not frames:
+            shutil.rmtree(partition, ignore_errors=True)
+            return 0
+
+        df = pd.concat(frames, axis=0, ignore_index=True)
+        os.makedirs(partition, exist_ok=True)
+        df.to_parquet(path + '.tmp', index=False)
+        os.replace(path + '.tmp', path)
+        return len(df)
+
+    def _partition_path(self, date: str) -> str:
+        return os.path.join(self.directory, f'date={date}', 'part.parquet')
+
+    def _save_manifest(self, manifest: dict) -> None:
+        with open(self.manifest_path + '.tmp', 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(self.manifest_path + '.tmp', self.manifest_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally syncs Search Console data into a local store.")
+    parser.add_argument('credentials', help="Path to the service account credentials JSON file.")
+    parser.add_argument('url', help="The Search Console property, e.g. https://www.instabase.jp/")
+    parser.add_argument('root', help="The directory of the local store.")
+    parser.add_argument('--dimensions', nargs='+', default=['query'])
+    parser.add_argument('--start-date', default=None)
+    parser.add_argument('--end-date', default=None)
+    parser.add_argument('--mutable-days', type=int, default=3)
+    args = parser.parse_args()
+
+    sc = IbSearchConsole(args.credentials, args.url)
+    sync = SearchConsoleSync(sc, args.root, dimensions=args.dimensions, mutable_days=args.mutable_days)
+    sync.sync(start_date=args.start_date, end_date=args.end_date)
+
+
+if __name__ == '__main__':
+    main()
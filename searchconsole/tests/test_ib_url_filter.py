@@ -0,0 +1,75 @@
+# Run from top of module
+import json
+import sys
+
+import pandas as pd
+
+sys.path.append('./')
+from src.ib_url_filter import IbUrlFilter
+
+PATHS = pd.Series([
+    '/',
+    '/tokyo',
+    '/tokyo-w13101',
+    '/tokyo-s2600/kaigishitsu',
+    '/chiba-w12221-rentalspace',
+    '/fukuoka-s9990505-salon',
+    '/aichi-w23101-event-hall',
+    '/chiba-chiba/kaigishitsu',
+    '/space/12345',
+    '/tokyo/list/christmas-party',
+    '/reviews/678',
+    '/owners/90',
+])
+
+
+def test_parse_should_match_the_per_method_results():
+    df = IbUrlFilter.parse(PATHS)
+
+    wards = IbUrlFilter.get_wards(PATHS)[0].str[1:].astype('Int64')
+    stations = IbUrlFilter.get_stations(PATHS)[0].str[1:].astype('Int64')
+    pd.testing.assert_series_equal(df['ward_id'], wards, check_names=False)
+    pd.testing.assert_series_equal(df['station_id'], stations, check_names=False)
+    assert df['category'].astype(object).fillna('').tolist() \
+        == IbUrlFilter.get_categories(PATHS)[0].fillna('').tolist()
+    assert df['prefecture'].astype(object).fillna('').tolist() \
+        == IbUrlFilter.get_prefectures(PATHS)[0].fillna('').tolist()
+    assert df['page_type'].tolist() == IbUrlFilter.get_page_types(PATHS).tolist()
+    assert df['area_type'].tolist() == IbUrlFilter.get_area_types(PATHS).tolist()
+
+
+def test_parse_should_find_ward_and_station_ids_in_the_middle_of_a_segment():
+    df = IbUrlFilter.parse(pd.Series(['/chiba-w12221-rentalspace', '/fukuoka-s9990505-salon', '/tokyo-w13101']))
+    assert df['area_type'].tolist() == ['ward', 'station', 'ward']
+    assert df['ward_id'].tolist() == [12221, pd.NA, 13101]
+    assert df['station_id'].tolist() == [pd.NA, 9990505, pd.NA]
+    assert df['category'].astype(object).fillna('').tolist() == ['rentalspace', 'salon', '']
+    assert df['prefecture'].tolist() == ['chiba', 'fukuoka', 'tokyo']
+
+
+def test_load_slugs_should_rebuild_every_index(tmp_path):
+    original = {name: list(getattr(IbUrlFilter, name)) for name in ('categories', 'prefectures', 'areas')}
+    path = tmp_path / 'slugs.json'
+    path.write_text(json.dumps({
+        'categories': original['categories'] + ['board-game-cafe'],
+        'prefectures': original['prefectures'] + ['narashino'],
+        'areas': original['areas'] + ['chiba-funabashi'],
+    }))
+    paths = pd.Series(['/narashino/board-game-cafe', '/chiba-funabashi/kaigishitsu', '/board-game-cafe'])
+
+    try:
+        IbUrlFilter.load_slugs(str(path))
+        df = IbUrlFilter.parse(paths)
+        assert df['category'].astype(object).fillna('').tolist() \
+            == ['board-game-cafe', 'kaigishitsu', 'board-game-cafe']
+        assert df['prefecture'].astype(object).fillna('').tolist() == ['narashino', 'chiba', '']
+        assert df['area'].astype(object).fillna('').tolist() == ['', 'chiba-funabashi', '']
+        # A new category is no longer a generic page.
+        assert IbUrlFilter.isgeneric(paths).tolist() == [False, False, False]
+    finally:
+        path.write_text(json.dumps(original))
+        IbUrlFilter.load_slugs(str(path))
+
+    df = IbUrlFilter.parse(paths)
+    assert df['category'].astype(object).fillna('').tolist() == ['', 'kaigishitsu', '']
+    assert IbUrlFilter.isgeneric(pd.Series(['/board-game-cafe'])).tolist() == [True]
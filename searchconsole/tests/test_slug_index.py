@@ -0,0 +1,35 @@
+# Run from top of module
+import sys
+
+sys.path.append('./')
+from src.slug_index import SlugIndex
+
+
+def test_match_should_prefer_the_longest_slug():
+    index = SlugIndex(['space', 'event-space', 'event'])
+    assert index.match('/tokyo/event-space') == 'event-space'
+    assert index.match('/tokyo-event-space-s2600') == 'event-space'
+    assert index.match('/tokyo/space') == 'space'
+
+
+def test_match_should_only_match_whole_tokens():
+    index = SlugIndex(['nara', 'space'])
+    assert index.match('/narashino') is None
+    assert index.match('/chiba-narashino/kaigishitsu') is None
+    assert index.match('/nara-s2600') == 'nara'
+    assert index.match('/tokyo/spaces') is None
+
+
+def test_match_should_ignore_the_query_string():
+    index = SlugIndex(['kaigishitsu'])
+    assert index.match('/tokyo?category=kaigishitsu') is None
+    assert index.match('/tokyo/kaigishitsu?page=2') == 'kaigishitsu'
+
+
+def test_anchored_match_should_only_look_at_the_start_of_the_first_segment():
+    index = SlugIndex(['tokyo', 'chiba', 'chiba-chiba'])
+    assert index.match('/chiba-chiba/kaigishitsu', anchored=True) == 'chiba-chiba'
+    assert index.match('/tokyo-s2600/kaigishitsu', anchored=True) == 'tokyo'
+    assert index.match('/space/tokyo', anchored=True) is None
+    assert index.match('/kanagawa-tokyo', anchored=True) is None
+    assert index.match('/kanagawa-tokyo') == 'tokyo'